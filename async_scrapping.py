@@ -0,0 +1,223 @@
+import asyncio
+import time
+import aiohttp
+from typing import List, Dict, Optional, Tuple
+from data_scrapping import HEADERS, search_pages, get_offers, get_offer_tiles, parse_offer_details
+from offer_sink import OfferSink, open_sink
+from page_archive import PageArchive
+from crawl_state import CrawlState, content_hash
+from rate_limiter import AdaptiveRateLimiter
+from scrape_metrics import ScrapeMetrics, timed_parse
+
+
+async def fetch_page(session: aiohttp.ClientSession, url: str, semaphore: asyncio.Semaphore,
+                     max_retries: int = 5, delay: int = 5, archive: Optional[PageArchive] = None,
+                     kind: str = 'page', limiter: Optional[AdaptiveRateLimiter] = None,
+                     metrics: Optional[ScrapeMetrics] = None) -> Optional[bytes]:
+    """Asynchronous counterpart of `open_website`.
+    :param session: Shared aiohttp session
+    :param url: URL of the website
+    :param semaphore: Semaphore limiting the number of requests in flight
+    :param max_retries: Maximum number of retries
+    :param delay: Delay between retries, replaced by the limiter's backoff if a limiter is given
+    :param archive: Archive of fetched pages, used for revalidation and storing the page
+    :param kind: Kind of the page stored in the archive ('search' or 'offer')
+    :param limiter: Shared rate limiter
+    :param metrics: Crawl metrics
+    :return: HTML content of the website
+    """
+    headers = archive.conditional_headers(url) if archive is not None else {}
+    attempts = 0
+    for attempt in range(max_retries):
+        if limiter is not None:
+            await limiter.acquire_async(url)
+        attempts += 1
+        status, retry_after, content = None, None, b''
+        try:
+            async with semaphore:
+                start = time.perf_counter()
+                async with session.get(url, headers=headers) as response:
+                    status, retry_after = response.status, response.headers.get('Retry-After')
+                    if status == 200:
+                        content = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"ClientError: {e!r} for {url}. Attempt {attempt+1} of {max_retries}.")
+            status = None
+        if metrics is not None:
+            metrics.record_response(kind, time.perf_counter() - start, status, len(content))
+        if limiter is not None:
+            limiter.release(url, status, retry_after)
+
+        if status == 200:
+            if archive is not None:
+                archive.store(url, content, kind, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            if metrics is not None:
+                metrics.record_request(kind, attempts, True)
+            return content
+        if status == 304 and archive is not None:
+            archive.mark_revalidated(url)
+            if metrics is not None:
+                metrics.record_request(kind, attempts, True)
+            return archive.latest(url)
+        if status == 503:
+            print(f"Status code 503 for {url}. Attempt {attempt+1} of {max_retries}.")
+        elif status is not None:
+            print(f"Error: {status} for {url}. Attempt {attempt+1} of {max_retries}.")
+            break
+        if limiter is None:
+            await asyncio.sleep(delay)
+
+    print(f"Unable to open {url} after max retries attempts.")
+    if metrics is not None:
+        metrics.record_request(kind, attempts, False)
+    return None
+
+
+async def fetch_offer_links(session: aiohttp.ClientSession, pages: List[str], semaphore: asyncio.Semaphore,
+                            archive: Optional[PageArchive] = None, limiter: Optional[AdaptiveRateLimiter] = None,
+                            metrics: Optional[ScrapeMetrics] = None) -> List[str]:
+    """Fetch all search pages in parallel and collect offer links in page order.
+    :param session: Shared aiohttp session
+    :param pages: List of search page URLs
+    :param semaphore: Semaphore limiting the number of requests in flight
+    :param archive: Archive of fetched pages
+    :param limiter: Shared rate limiter
+    :param metrics: Crawl metrics
+    :return: List of offer links
+    """
+    contents = await asyncio.gather(*(fetch_page(session, url, semaphore, archive=archive, kind='search', limiter=limiter, metrics=metrics)
+                                      for url in pages))
+    all_offer_links = []
+    for content in contents:
+        if content is not None:
+            all_offer_links.extend(timed_parse(metrics, 'search', get_offers, content))
+    return all_offer_links
+
+
+async def fetch_offer(session: aiohttp.ClientSession, url: str, semaphore: asyncio.Semaphore,
+                      archive: Optional[PageArchive] = None, limiter: Optional[AdaptiveRateLimiter] = None,
+                      metrics: Optional[ScrapeMetrics] = None) -> Tuple[str, Optional[Dict]]:
+    """Fetch a single offer page and parse it.
+    :param session: Shared aiohttp session
+    :param url: URL of the offer page
+    :param semaphore: Semaphore limiting the number of requests in flight
+    :param archive: Archive of fetched pages
+    :param limiter: Shared rate limiter
+    :param metrics: Crawl metrics
+    :return: Offer URL and dictionary of offer details (None if the page could not be fetched)
+    """
+    content = await fetch_page(session, url, semaphore, archive=archive, kind='offer', limiter=limiter, metrics=metrics)
+    if content is None:
+        return url, None
+    return url, timed_parse(metrics, 'offer', parse_offer_details, content)
+
+
+async def crawl_incremental(session: aiohttp.ClientSession, pages: List[str], semaphore: asyncio.Semaphore,
+                            state: CrawlState, sink: OfferSink, archive: Optional[PageArchive] = None,
+                            limiter: Optional[AdaptiveRateLimiter] = None, metrics: Optional[ScrapeMetrics] = None) -> List[Dict]:
+    """Resumable, incremental variant of the crawl (see `data_scrapping.crawl`).
+    Every offer is written and checkpointed as soon as it's parsed, so rows are written in completion order.
+    :param session: Shared aiohttp session
+    :param pages: List of search page URLs
+    :param semaphore: Semaphore limiting the number of requests in flight
+    :param state: Persistent crawl state
+    :param sink: Output sink for the offers
+    :param archive: Archive of fetched pages
+    :param limiter: Shared rate limiter
+    :param metrics: Crawl metrics
+    :return: List of new or changed offer details
+    """
+    state.start_run()
+    sink.on_flush.append(state.commit)
+
+    async def process_page(url: str) -> None:
+        content = await fetch_page(session, url, semaphore, archive=archive, kind='search', limiter=limiter, metrics=metrics)
+        if content is not None:
+            state.mark_page_done(url, timed_parse(metrics, 'search', get_offer_tiles, content))
+
+    await asyncio.gather(*(process_page(url) for url in pages if not state.page_done(url)))
+
+    changed = []
+
+    async def process_offer(url: str, tile_hash: str) -> None:
+        _, offer_details = await fetch_offer(session, url, semaphore, archive, limiter, metrics)
+        offer_hash = content_hash(offer_details) if offer_details else None
+        if offer_details and state.is_changed(url, offer_hash):
+            sink.write(offer_details, url=url)
+            changed.append(offer_details)
+        state.mark_offer_done(url, tile_hash, offer_hash)
+
+    await asyncio.gather(*(process_offer(url, tile_hash) for url, tile_hash in state.pending_offers()))
+    sink.flush()
+    sink.on_flush.remove(state.commit)
+    state.finish_run()
+    return changed
+
+
+async def crawl(pages: List[str], concurrency: int = 16, timeout: float = 30, archive: Optional[PageArchive] = None,
+                state: Optional[CrawlState] = None, sink: Optional[OfferSink] = None,
+                limiter: Optional[AdaptiveRateLimiter] = None, metrics: Optional[ScrapeMetrics] = None) -> List[Dict]:
+    """Crawl search pages and offers concurrently.
+    Without a crawl state, offers are returned (and written to the sink, if given) in the same order
+    as the sequential crawl in `data_scrapping.py` would produce them. With a crawl state, the crawl is
+    resumable and incremental, every new or changed offer is written to the sink as soon as it's parsed and returned.
+    :param pages: List of search page URLs
+    :param concurrency: Maximum number of requests in flight
+    :param timeout: Total timeout of a single request in seconds
+    :param archive: Archive of fetched pages
+    :param state: Persistent crawl state
+    :param sink: Output sink for the offers, required with a crawl state
+    :param limiter: Shared rate limiter
+    :param metrics: Crawl metrics, dumped to `metrics.path` when the crawl ends (also on failure)
+    :return: List of offer details
+    """
+    if state is not None and sink is None:
+        raise ValueError("An incremental crawl needs an output sink")
+    try:
+        return await _crawl(pages, concurrency, timeout, archive, state, sink, limiter, metrics)
+    finally:
+        if metrics is not None:
+            metrics.dump()
+
+
+async def _crawl(pages: List[str], concurrency: int, timeout: float, archive: Optional[PageArchive], state: Optional[CrawlState],
+                 sink: Optional[OfferSink], limiter: Optional[AdaptiveRateLimiter], metrics: Optional[ScrapeMetrics]) -> List[Dict]:
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(headers=HEADERS, connector=connector, timeout=client_timeout) as session:
+        if state is not None:
+            return await crawl_incremental(session, pages, semaphore, state, sink, archive, limiter, metrics)
+        offer_links = await fetch_offer_links(session, pages, semaphore, archive, limiter, metrics)
+        results = await asyncio.gather(*(fetch_offer(session, link, semaphore, archive, limiter, metrics) for link in offer_links))
+    if sink is not None:
+        for url, offer_details in results:
+            sink.write(offer_details, url=url)
+        sink.flush()
+    return [offer_details for _, offer_details in results if offer_details]
+
+
+def run_crawl(pages: List[str], concurrency: int = 16, archive: Optional[PageArchive] = None,
+              state: Optional[CrawlState] = None, sink: Optional[OfferSink] = None,
+              limiter: Optional[AdaptiveRateLimiter] = None, metrics: Optional[ScrapeMetrics] = None) -> List[Dict]:
+    """Run the asynchronous crawl from synchronous code.
+    :param pages: List of search page URLs
+    :param concurrency: Maximum number of requests in flight
+    :param archive: Archive of fetched pages
+    :param state: Persistent crawl state
+    :param sink: Output sink for the offers, required with a crawl state
+    :param limiter: Shared rate limiter
+    :param metrics: Crawl metrics
+    :return: List of offer details
+    """
+    return asyncio.run(crawl(pages, concurrency=concurrency, archive=archive, state=state, sink=sink, limiter=limiter, metrics=metrics))
+
+
+if __name__ == '__main__':
+    concurrency = 16
+    archive = PageArchive('archive')
+    state = CrawlState('crawl_state.sqlite')
+    limiter = AdaptiveRateLimiter()
+    metrics = ScrapeMetrics('crawl_metrics.json')
+    with open_sink('listings.sqlite', batch_size=500) as sink:
+        run_crawl(search_pages(), concurrency=concurrency, archive=archive, state=state, sink=sink, limiter=limiter, metrics=metrics)
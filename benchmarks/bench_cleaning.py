@@ -0,0 +1,209 @@
+"""Throughput of the cleaning stage on a synthetic national-size dataset.
+
+Raw offers are rebuilt from `data_cleaned.csv` in the scraper's CSV layout (`basic_info` and `detailed_info`
+as stringified lists and dictionaries) and repeated up to the requested number of rows. The 'extract' stage
+compares the extraction engines of `extract_information`, the 'format' stage the engines of `clear_format_data`
+and checks the quarantine of partitions with an empty column and the district lookups, the 'parallel' stage runs
+the whole cleaning with `clean_chunked` on a growing number of worker processes and checks its duplicates file
+and the 'dedup' stage checks and times the near-duplicate removal of `deduplication.py`.
+
+Run from the project root:
+    python -m benchmarks.bench_cleaning --rows 1000000
+    python -m benchmarks.bench_cleaning --rows 5000000 --stages format
+    python -m benchmarks.bench_cleaning --rows 2000000 --stages parallel --workers 1 2 4 8 16
+    python -m benchmarks.bench_cleaning --rows 1000000 --stages dedup
+"""
+import argparse
+import contextlib
+import filecmp
+import io
+import os
+import shutil
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from data_clearing import DUPLICATES_PATH, extract_columns, format_data, clean_chunked, validate_format_data
+from deduplication import deduplicate, location_part
+from gazetteer import DISTRICTS, UNKNOWN_DISTRICT, Gazetteer
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def raw_offers(rows: int, source: str = os.path.join(PROJECT_ROOT, 'data_cleaned.csv')) -> pd.DataFrame:
+    """Build `rows` raw offers in the layout read by `data_clearing.load_raw_offers` from a CSV file.
+    :param rows: Number of rows
+    :param source: Output of `extract_information` used as the source of the values
+    :return: DataFrame of raw offers
+    """
+    cleaned = pd.read_csv(source, dtype=str, keep_default_na=False)
+    records = []
+    for row in cleaned.itertuples(index=False):
+        floor = f'{row.floor} / {row.total_floors}' if row.total_floors else row.floor
+        basic_info = [f'Liczba pokoi:   {row.rooms}', f'Piętro:   {floor}', f'Rok budowy:   {row.year}',
+                      f'Miejsce parkingowe:   {row.parking}', f'Stan mieszkania:   {row.state}', 'Typ budynku:   blok']
+        detailed_info = {'Rynek': row.market, 'Forma własności': 'pełna własność', 'Czynsz': '650\xa0zł',
+                         'Wyposażenie': 'umeblowane, lodówka' if row.furnished == 'Tak' else 'lodówka'}
+        records.append((row.location, row.price, row.area, 'Ogłoszenie obejrzało 254 osób', str(basic_info), str(detailed_info)))
+    data = pd.DataFrame(records, columns=['location', 'price', 'area', 'call', 'basic_info', 'detailed_info'])
+    return repeat_rows(data, rows)
+
+
+def extracted_offers(rows: int, source: str = os.path.join(PROJECT_ROOT, 'data_cleaned.csv')) -> pd.DataFrame:
+    """Build `rows` offers in the layout read by `clear_format_data`."""
+    return repeat_rows(pd.read_csv(source), rows)
+
+
+def repeat_rows(data: pd.DataFrame, rows: int) -> pd.DataFrame:
+    """Repeat the rows of a DataFrame up to the requested number of rows."""
+    return pd.concat([data] * (rows // len(data) + 1), ignore_index=True).head(rows)
+
+
+def timed(function: Callable[[], pd.DataFrame]) -> Dict:
+    """Run the function and return its result with the run time."""
+    start = time.perf_counter()
+    result = function()
+    return {'seconds': time.perf_counter() - start, 'result': result}
+
+
+def parallel_scaling(rows: int, workers: List[int], chunksize: int) -> None:
+    """Clean `rows` raw offers with every worker count and print the speedup over a single worker."""
+    with tempfile.TemporaryDirectory() as directory:
+        raw_path = os.path.join(directory, 'raw.csv')
+        raw_offers(rows).to_csv(raw_path, index=False)
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            seconds = {}
+            for count in workers:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    seconds[count] = timed(lambda: clean_chunked(raw_path, chunksize=chunksize, workers=count))['seconds']
+                if count == workers[0]:
+                    shutil.copy('data_cleaned_formated.csv', 'reference.csv')
+                assert filecmp.cmp('data_cleaned_formated.csv', 'reference.csv', shallow=False), f"Output differs with {count} workers"
+                speedup = seconds[workers[0]] / seconds[count] * workers[0]
+                print(f"{count:>3} workers: {seconds[count]:.2f} s, {rows / seconds[count]:.0f} rows/s, "
+                      f"speedup {speedup:.1f}x, efficiency {speedup / count:.0%}")
+        finally:
+            os.chdir(cwd)
+
+
+def empty_columns(data: pd.DataFrame) -> None:
+    """Check that offers of a partition whose cells of a column are all empty are quarantined instead of failing."""
+    for column in data.columns:
+        partition = data.head(100).assign(**{column: float('nan')})
+        formatted, quarantine = validate_format_data(partition, 'vectorized')
+        assert formatted.empty and (quarantine['reasons'].str.contains(f'{column}:missing')).all(), \
+            f"Offers without {column} aren't quarantined"
+
+
+def district_lookups() -> None:
+    """Check that the gazetteer forgives typos and diacritics but doesn't match streets to similar estates."""
+    gazetteer = Gazetteer(DISTRICTS)
+    expected = {'Krzki': 'Krzyki', 'Olbin': 'Stare Miasto', 'ul. Gadow-Maly': 'Fabryczna', 'Kozanow': 'Fabryczna',
+                'Przedmieście Świdnikie': 'Śródmieście', 'Różana': UNKNOWN_DISTRICT, 'Grabiszyńska': UNKNOWN_DISTRICT,
+                'Popowicka': UNKNOWN_DISTRICT, 'Krzycka': UNKNOWN_DISTRICT}
+    resolved = {location: gazetteer.resolve(location) for location in expected}
+    assert resolved == expected, f"Districts resolved wrongly: {set(resolved.items()) - set(expected.items())}"
+
+
+def chunked_duplicates(rows: int = 1000) -> None:
+    """Check the duplicates file of the chunked cleaning: written only on request and with the header of the report
+    also if the first partition has no duplicates."""
+    extracted = extracted_offers(rows)
+    offers = format_data(extracted.copy(), 'vectorized')
+    titles = extracted.loc[offers.index, 'location']
+    first, second = titles.index[~titles.map(location_part).duplicated().to_numpy()][:2]
+    # Partitions of two offers: two different offers, then each of them repeated
+    raw = raw_offers(rows).loc[[first, second, first, first, second, second]]
+    with tempfile.TemporaryDirectory() as directory:
+        raw_path = os.path.join(directory, 'raw.csv')
+        raw.to_csv(raw_path, index=False)
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                clean_chunked(raw_path, chunksize=2)
+            assert not os.path.exists(DUPLICATES_PATH), "Duplicates file written without removing duplicates"
+            with contextlib.redirect_stdout(io.StringIO()):
+                clean_chunked(raw_path, chunksize=2, remove_duplicates=True)
+            duplicates = pd.read_csv(DUPLICATES_PATH)
+            formatted = pd.read_csv('data_cleaned_formated.csv')
+            assert list(duplicates.columns) == ['row', *formatted.columns, 'title', 'cluster', 'canonical'], \
+                "Duplicates file has a wrong header"
+            assert len(formatted) == 4 and len(duplicates) == 4, "Repeated offers of a partition aren't removed"
+        finally:
+            os.chdir(cwd)
+
+
+def deduplication(rows: int) -> None:
+    """Check `deduplicate` on offers without duplicates and on repeated offers, then time it on `rows` offers."""
+    extracted = extracted_offers(rows)
+    offers = format_data(extracted.copy(), 'vectorized')
+    titles = extracted.loc[offers.index, 'location']
+    # Offers on different streets are all kept, also when there are too few offers to form a candidate pair
+    distinct = offers[~titles.map(location_part).duplicated().to_numpy()]
+    for size in [1, 2, min(len(distinct), 100)]:
+        kept, report = deduplicate(distinct.head(size), titles[distinct.index[:size]])
+        assert len(kept) == size and report.empty, f"Offers without duplicates removed from {size} offers"
+    # A repeated offer is kept once, unless its building, market or street differs or its price drifts too far
+    repeated = pd.concat([distinct.head(2)] * 3, ignore_index=True)
+    kept, _ = deduplicate(repeated, pd.concat([titles[distinct.index[:2]]] * 3, ignore_index=True))
+    assert len(kept) == 2, f"{len(kept)} of 2 repeated offers kept"
+    offer, title = distinct.head(1), titles[distinct.index[0]]
+    variants = pd.concat([offer, offer.assign(total_floors=offer['total_floors'] + 1),
+                          offer.assign(market='secondary' if offer['market'].iloc[0] == 'primary' else 'primary'),
+                          offer, offer.assign(price=offer['price'] * 1.08), offer.assign(price=offer['price'] * 1.16)],
+                         ignore_index=True)
+    variant_titles = pd.Series([title] * 3 + ['Zupełnie Inna, ' + title] + [title] * 2)
+    kept, report = deduplicate(variants, variant_titles)
+    assert len(kept) == 5 and len(report) == 2, f"{len(variants) - len(kept)} of 6 variants removed"
+    # A large cluster of reposts with drifting prices is split around canonical offers without comparing all pairs
+    reposts = pd.concat([offer] * 20_000, ignore_index=True)
+    reposts['price'] = offer['price'].iloc[0] * (1 + np.linspace(0, 0.25, len(reposts)))
+    result = timed(lambda: deduplicate(reposts, pd.Series([title] * len(reposts))))
+    kept, report = result['result']
+    assert 2 <= len(kept) <= 3 and len(report) == len(reposts), f"{len(kept)} of {len(reposts)} reposts kept"
+    print(f"{len(reposts)} reposts, {len(kept)} kept: {result['seconds']:.2f} s")
+    result = timed(lambda: deduplicate(offers, titles))
+    kept, report = result['result']
+    print(f"{len(offers)} offers, {len(kept)} kept, {len(report)} in duplicate clusters: {result['seconds']:.2f} s, "
+          f"{len(offers) / result['seconds']:.0f} rows/s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10 ** 6)
+    parser.add_argument('--stages', nargs='+', default=['extract', 'format'], choices=['extract', 'format', 'parallel', 'dedup'])
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, 2, 4, 8], help='Worker counts of the parallel stage')
+    parser.add_argument('--chunksize', type=int, default=50_000, help='Partition size of the parallel stage')
+    args = parser.parse_args()
+
+    if 'parallel' in args.stages:
+        print(f"parallel: {args.rows} offers, {os.cpu_count()} CPUs")
+        parallel_scaling(args.rows, args.workers, args.chunksize)
+        chunked_duplicates()
+
+    if 'dedup' in args.stages:
+        print(f"dedup: {args.rows} offers")
+        deduplication(args.rows)
+
+    stages = {
+        'extract': (raw_offers, extract_columns, ('legacy', 'single_pass')),
+        'format': (extracted_offers, format_data, ('legacy', 'vectorized')),
+    }
+    for stage in [stage for stage in args.stages if stage not in ('parallel', 'dedup')]:
+        build, function, engines = stages[stage]
+        data = build(args.rows)
+        print(f"{stage}: {len(data)} offers")
+        results = {engine: timed(lambda: function(data.copy(), engine)) for engine in engines}
+        assert results[engines[0]]['result'].equals(results[engines[1]]['result']), f"{stage} engines differ"
+        if stage == 'format':
+            empty_columns(data)
+            district_lookups()
+        for engine, result in results.items():
+            print(f"{engine:>12}: {result['seconds']:.2f} s, {len(data) / result['seconds']:.0f} rows/s")
+        print(f"speedup {results[engines[0]]['seconds'] / results[engines[1]]['seconds']:.1f}x")
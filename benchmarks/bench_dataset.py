@@ -0,0 +1,107 @@
+"""Load time of the cleaned dataset from its storage formats and query time of the aggregation cube.
+
+The cleaned sample dataset is repeated up to the requested number of rows. The 'load' stage writes it as Parquet,
+CSV and to a listing store, checks that every format returns the same offers for full loads and for column
+projections (cleaned columns only, derived columns only and both) and times them. The 'cube' stage checks the
+statistics of `aggregation_cube.AggregationCube` against a pandas grouping of the offers and times both.
+
+Run from the project root:
+    python -m benchmarks.bench_dataset --rows 1000000
+    python -m benchmarks.bench_dataset --rows 1000000 --stages cube
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from aggregation_cube import AggregationCube, YEAR_BUCKET
+from cleaned_dataset import COLUMNS, write_dataset
+from data_clearing import load_cleaned_data
+from derived_features import DERIVED_COLUMNS
+from listing_store import ListingStore
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Column selections of the 'load' stage, None loads the whole dataset
+PROJECTIONS: Dict[str, Optional[List[str]]] = {
+    'all': None,
+    'cleaned': ['price', 'location'],
+    'derived': ['price_per_m2', 'floor_ratio'],
+    'mixed': ['location', 'price_per_m2', 'rooms'],
+}
+
+
+def cleaned_offers(rows: int, source: str = os.path.join(PROJECT_ROOT, 'data_cleaned_formated.parquet')) -> pd.DataFrame:
+    """Build `rows` cleaned offers with the derived columns by repeating the cleaned sample dataset."""
+    data = load_cleaned_data(source, COLUMNS + DERIVED_COLUMNS)
+    return pd.concat([data] * (rows // len(data) + 1), ignore_index=True).head(rows)
+
+
+def loading(rows: int) -> None:
+    """Write `rows` cleaned offers in every format, check the loaded projections agree and print their load times."""
+    data = cleaned_offers(rows)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {'parquet': os.path.join(directory, 'data.parquet'), 'csv': os.path.join(directory, 'data.csv'),
+                 'sqlite': os.path.join(directory, 'listings.sqlite')}
+        write_dataset(data, paths['parquet'])
+        # The cleaning writes the CSV file and the listing store without the derived columns
+        data[COLUMNS].to_csv(paths['csv'], index=False)
+        with ListingStore(paths['sqlite']) as store:
+            store.write_cleaned(data[COLUMNS])
+        for name, columns in PROJECTIONS.items():
+            seconds = {}
+            for storage, path in paths.items():
+                start = time.perf_counter()
+                loaded = load_cleaned_data(path, columns)
+                seconds[storage] = time.perf_counter() - start
+                assert list(loaded.columns) == (columns or COLUMNS), f"{storage} returned other columns for {name}"
+                pd.testing.assert_frame_equal(loaded, data[list(loaded.columns)], check_categorical=False, check_dtype=False)
+            print(f"{name:>8}: " + ", ".join(f"{storage} {value:.2f} s" for storage, value in seconds.items()))
+
+
+def cube_queries(rows: int) -> None:
+    """Check the cube on edge cases and against pandas, then time its build and a roll-up per district."""
+    data = cleaned_offers(rows)
+    # Plain measures need only their own columns, empty frames and offers with missing dimensions give no cells
+    plain = AggregationCube(data[['location', 'rooms', 'year', 'market', 'price']].head(1000), measures=['price'])
+    assert plain.query()['count'].iloc[0] == 1000, "Cube of a plain measure lost offers"
+    assert AggregationCube(data.head(0)).query(by=['location']).empty, "Cube of no offers has cells"
+    unknown_year = data.head(1000).astype({'year': 'Int64'})
+    unknown_year.loc[:9, 'year'] = pd.NA
+    cube = AggregationCube(unknown_year)
+    assert cube.dropped == 10 and cube.query()['count'].iloc[0] == 990, "Offers without a year are counted"
+
+    start = time.perf_counter()
+    cube = AggregationCube(data)
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    result = cube.query(by=['location', 'rooms'], market='secondary')
+    queried = time.perf_counter() - start
+    start = time.perf_counter()
+    grouped = data[data['market'] == 'secondary'].groupby(['location', 'rooms'], observed=True)['price'].agg(['size', 'mean', 'min', 'max'])
+    pandas_seconds = time.perf_counter() - start
+    grouped = grouped[grouped['size'] > 0]
+    result = result.loc[grouped.index]
+    assert np.array_equal(result['count'], grouped['size']), "Cube counts differ from pandas"
+    for statistic in ['mean', 'min', 'max']:
+        assert np.allclose(result[f'price_{statistic}'], grouped[statistic]), f"Cube {statistic} differs from pandas"
+    print(f"build {built:.2f} s, query by district and rooms {queried * 1000:.1f} ms, pandas {pandas_seconds * 1000:.1f} ms, "
+          f"{len(result)} groups, {len(cube.count)} cells of {YEAR_BUCKET}-year buckets")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10 ** 6)
+    parser.add_argument('--stages', nargs='+', default=['load', 'cube'], choices=['load', 'cube'])
+    args = parser.parse_args()
+
+    if 'load' in args.stages:
+        print(f"load: {args.rows} offers")
+        loading(args.rows)
+
+    if 'cube' in args.stages:
+        print(f"cube: {args.rows} offers")
+        cube_queries(args.rows)
@@ -0,0 +1,51 @@
+"""Parse throughput of the extraction engines over the saved sample pages.
+
+Run from the project root:
+    python -m benchmarks.bench_extraction
+"""
+import glob
+import os
+import time
+from typing import Callable, List
+
+from data_scrapping import get_offers, parse_offer_details
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def load_pages(pattern: str) -> List[bytes]:
+    """Load the saved sample pages matching the glob pattern."""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, pattern))):
+        with open(path, 'rb') as f:
+            pages.append(f.read())
+    return pages
+
+
+def throughput(function: Callable, pages: List[bytes], engine: str, repeat: int) -> float:
+    """Return the number of pages parsed per second."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            function(page, engine=engine)
+    return repeat * len(pages) / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    repeat = 200
+    offer_pages = load_pages('offer*.html')
+    search_pages = load_pages('search*.html')
+
+    # Pages without a declared encoding and with scripts within the extracted fields are extracted alike
+    variants = [page.replace(b'<meta charset="utf-8">', b'') for page in offer_pages]
+    variants += [page.replace(b'<h2 class="header-e">', b'<h2 class="header-e"><script>var x = 1;</script><style>h2 {}</style>')
+                 for page in offer_pages]
+    for page in offer_pages + variants:
+        assert parse_offer_details(page, engine='bs4') == parse_offer_details(page, engine='lxml'), "Engines differ on an offer page"
+    for page in search_pages:
+        assert get_offers(page, engine='bs4') == get_offers(page, engine='lxml'), "Engines differ on a search page"
+
+    for name, function, pages in [('parse_offer_details', parse_offer_details, offer_pages), ('get_offers', get_offers, search_pages)]:
+        results = {engine: throughput(function, pages, engine, repeat) for engine in ('bs4', 'lxml')}
+        print(f"{name}: " + ", ".join(f"{engine} {rate:.0f} pages/s" for engine, rate in results.items())
+              + f", speedup {results['lxml'] / results['bs4']:.1f}x")
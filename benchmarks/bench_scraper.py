@@ -0,0 +1,111 @@
+"""Scraper throughput benchmark against the local replay server.
+
+Runs the crawl modes of the scraper against `replay_server.ReplayServer` and reports pages/s, offers/s
+and the parse time per offer, so modes can be compared deterministically without network access.
+
+Run from the project root:
+    python -m benchmarks.bench_scraper --pages 10 --latency 0.05
+    python -m benchmarks.bench_scraper --archive archive --modes async pipeline
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from data_scrapping import crawl, search_pages, parse_offer_details, get_offers
+from async_scrapping import run_crawl
+from scrape_pipeline import run_pipeline
+from offer_sink import JsonLinesSink, load_offers
+from page_archive import PageArchive
+from rate_limiter import AdaptiveRateLimiter
+from replay_server import ReplayServer, archived_pages, fixture_pages
+
+
+def run_mode(name: str, server: ReplayServer, pages: List[str], output_dir: str, concurrency: int, parse_workers: int,
+             use_limiter: bool = False) -> Dict[str, float]:
+    """Run a single crawl mode and return its throughput.
+    :param name: 'sequential', 'async' or 'pipeline'
+    :param server: Running replay server
+    :param pages: Local URLs of the search pages
+    :param output_dir: Directory for the output files
+    :param concurrency: Maximum number of requests in flight
+    :param parse_workers: Number of processes in the parsing pool of the pipeline
+    :param use_limiter: Run the mode with a fresh `AdaptiveRateLimiter`
+    :return: Dictionary of measurements
+    """
+    limiter = AdaptiveRateLimiter() if use_limiter else None
+    modes: Dict[str, Callable[[JsonLinesSink], object]] = {
+        'sequential': lambda sink: crawl(pages, sink, limiter=limiter),
+        'async': lambda sink: run_crawl(pages, concurrency=concurrency, sink=sink, limiter=limiter),
+        'pipeline': lambda sink: run_pipeline(pages, sink, fetch_concurrency=concurrency, parse_workers=parse_workers, limiter=limiter),
+    }
+    path = os.path.join(output_dir, f'{name}.jsonl')
+    served_before = server.stats['200']
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), JsonLinesSink(path, batch_size=500) as sink:
+        modes[name](sink)
+    elapsed = time.perf_counter() - start
+    return {
+        'seconds': elapsed,
+        'pages_per_sec': (server.stats['200'] - served_before) / elapsed,
+        'offers_per_sec': sink.written / elapsed,
+        'offers': sink.written,
+        'path': path,
+    }
+
+
+def parse_time(site: Dict[str, bytes], engine: str, search_urls: List[str]) -> Dict[str, float]:
+    """Measure the mean parse time of search and offer pages in milliseconds."""
+    search = [site[url] for url in search_urls if url in site]
+    offers = [content for url, content in site.items() if url not in set(search_urls)]
+    start = time.perf_counter()
+    for content in search:
+        get_offers(content, engine=engine)
+    search_time = (time.perf_counter() - start) / max(len(search), 1)
+    start = time.perf_counter()
+    for content in offers:
+        parse_offer_details(content, engine=engine)
+    offer_time = (time.perf_counter() - start) / max(len(offers), 1)
+    return {'search_ms': search_time * 1000, 'offer_ms': offer_time * 1000}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--archive', help='Replay pages recorded in this PageArchive directory instead of the sample fixtures')
+    parser.add_argument('--pages', type=int, default=10, help='Number of search pages (fixtures only)')
+    parser.add_argument('--latency', type=float, default=0.05, help='Response latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Additional per-URL latency of up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--parse-workers', type=int, default=4)
+    parser.add_argument('--limiter', action='store_true', help='Use the adaptive rate limiter in every mode')
+    parser.add_argument('--modes', nargs='+', default=['sequential', 'async', 'pipeline'], choices=['sequential', 'async', 'pipeline'])
+    args = parser.parse_args()
+
+    if args.archive:
+        site = archived_pages(PageArchive(args.archive))
+        search_urls = [url for url, _ in PageArchive(args.archive).iter_latest(kind='search')]
+    else:
+        site = fixture_pages(args.pages)
+        search_urls = search_pages(pages=args.pages)
+
+    print(f"Site: {len(search_urls)} search pages, {len(site) - len(search_urls)} offers, "
+          f"latency {args.latency * 1000:.0f} ms, 503 rate {args.error_rate:.0%}")
+    for engine in ('bs4', 'lxml'):
+        times = parse_time(site, engine, search_urls)
+        print(f"parse [{engine:>4}]: {times['search_ms']:.2f} ms/search page, {times['offer_ms']:.2f} ms/offer")
+
+    results = {}
+    with ReplayServer(site, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, retry_after=1) as server, \
+            tempfile.TemporaryDirectory() as output_dir:
+        pages = server.urls(search_urls)
+        for mode in args.modes:
+            results[mode] = run_mode(mode, server, pages, output_dir, args.concurrency, args.parse_workers, args.limiter)
+            print(f"{mode:>10}: {results[mode]['seconds']:.2f} s, {results[mode]['pages_per_sec']:.1f} pages/s, "
+                  f"{results[mode]['offers_per_sec']:.1f} offers/s ({results[mode]['offers']} offers)")
+        offer_sets = {mode: set(load_offers(result['path'])['url']) for mode, result in results.items() if result['offers']}
+        if len(set(map(frozenset, offer_sets.values()))) > 1:
+            print("Warning: crawl modes scraped different sets of offers")
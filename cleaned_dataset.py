@@ -0,0 +1,116 @@
+import os
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+from derived_features import DERIVED_SCHEMA, DERIVED_COLUMNS, add_derived, source_columns
+
+# Canonical location of the cleaned dataset, `LEGACY_PATH` is the CSV written by earlier versions of the cleaning
+DATASET_PATH = 'data_cleaned_formated.parquet'
+LEGACY_PATH = 'data_cleaned_formated.csv'
+
+# Column types of the cleaned dataset, in column order
+SCHEMA = {
+    'location': 'category',
+    'price': 'float64',
+    'area': 'float64',
+    'rooms': 'int8',
+    'floor': 'int8',
+    'total_floors': 'int8',
+    'year': 'int16',
+    'parking': 'int8',
+    'state': 'category',
+    'furnished': 'int8',
+    'market': 'category',
+}
+COLUMNS = list(SCHEMA)
+# Types of all columns stored in the dataset, the derived columns (see `derived_features.py`) follow the cleaned ones
+STORED_SCHEMA = {**SCHEMA, **DERIVED_SCHEMA}
+
+
+def dataset_path(directory: str = '') -> str:
+    """Return the path of the cleaned dataset in a directory, the legacy CSV file if no Parquet file exists yet."""
+    path = os.path.join(directory, DATASET_PATH)
+    return path if os.path.exists(path) or not os.path.exists(os.path.join(directory, LEGACY_PATH)) else os.path.join(directory, LEGACY_PATH)
+
+
+def apply_schema(data: pd.DataFrame) -> pd.DataFrame:
+    """Convert the columns of a cleaned dataset to the types of `SCHEMA` (and `DERIVED_SCHEMA` for derived columns).
+    :param data: Cleaned offers with all or some of the schema columns
+    :return: DataFrame with the schema column order and types
+    """
+    unknown = [column for column in data.columns if column not in STORED_SCHEMA]
+    if unknown:
+        raise ValueError(f"Columns {', '.join(unknown)} are not part of the cleaned dataset")
+    data = data[[column for column in STORED_SCHEMA if column in data.columns]].copy()
+    for column in data.columns:
+        dtype = STORED_SCHEMA[column]
+        if dtype.startswith('int'):
+            info = np.iinfo(dtype)
+            values = data[column]
+            if values.isna().any() or (values < info.min).any() or (values > info.max).any():
+                raise ValueError(f"Column {column} has values that don't fit {dtype}")
+        data[column] = data[column].astype(dtype)
+    return data
+
+
+def arrow_table(data: pd.DataFrame):
+    """Convert cleaned offers to an Arrow table, categories are dictionary-encoded strings with 32-bit indices,
+    so tables of different parts of the dataset share the same schema.
+    The derived columns are materialized once here if the data has all cleaned columns.
+    """
+    import pyarrow as pa
+    data = apply_schema(add_derived(data) if set(COLUMNS) <= set(data.columns) else data)
+    fields = [pa.field(column, pa.dictionary(pa.int32(), pa.string()) if STORED_SCHEMA[column] == 'category'
+                       else pa.from_numpy_dtype(np.dtype(STORED_SCHEMA[column])), nullable=False) for column in data.columns]
+    return pa.Table.from_pandas(data, schema=pa.schema(fields), preserve_index=False)
+
+
+def write_dataset(data: pd.DataFrame, path: str = DATASET_PATH) -> None:
+    """Write the cleaned dataset as a Parquet file with the types of `SCHEMA` and the derived columns.
+    :param data: Cleaned offers
+    :param path: Path to the Parquet file
+    """
+    with DatasetWriter(path) as writer:
+        writer.write(data)
+
+
+def read_dataset(path: str = DATASET_PATH, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Read the cleaned dataset, only the requested columns are read from disk.
+    Derived columns are only read on request, files written before they were stored compute them on the fly.
+    :param path: Path to the Parquet file
+    :param columns: Columns to read, cleaned or derived, the cleaned columns by default
+    :return: DataFrame with the types of `SCHEMA` and `DERIVED_SCHEMA`
+    """
+    import pyarrow.parquet as pq
+    columns = columns or COLUMNS
+    stored = set(pq.read_schema(path).names)
+    if all(column in stored for column in columns):
+        return pd.read_parquet(path, columns=columns)
+    data = pd.read_parquet(path, columns=[column for column in source_columns(columns) if column in stored])
+    return add_derived(data, [column for column in columns if column in DERIVED_COLUMNS])[columns]
+
+
+class DatasetWriter:
+    """Write the cleaned dataset in parts, every part is a row group of a single Parquet file."""
+
+    def __init__(self, path: str = DATASET_PATH):
+        import pyarrow.parquet as pq
+        self._pq = pq
+        self.path = path
+        self.writer = None
+
+    def write(self, data: pd.DataFrame) -> None:
+        table = arrow_table(data)
+        if self.writer is None:
+            self.writer = self._pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import sqlite3
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+
+def content_hash(offer_details: Dict) -> str:
+    """Hash parsed offer details, so markup-only changes of a page don't count as a change of the offer."""
+    return hashlib.sha1(json.dumps(offer_details, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class CrawlState:
+    """Persistent crawl state stored in SQLite.
+    - `offers` keeps every offer URL ever seen with the hash of its search tile and of its parsed content,
+      so a rerun only fetches offers that are new or whose tile changed.
+    - `runs`, `run_pages` and `run_offers` checkpoint the progress of the current run,
+      so a crashed crawl resumes where it stopped.
+    """
+
+    def __init__(self, path: str = 'crawl_state.sqlite'):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at TEXT NOT NULL,
+                finished_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS run_pages (
+                run_id INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                done_at TEXT NOT NULL,
+                PRIMARY KEY (run_id, url)
+            );
+            CREATE TABLE IF NOT EXISTS run_offers (
+                run_id INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                tile_hash TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (run_id, url)
+            );
+            CREATE TABLE IF NOT EXISTS offers (
+                url TEXT PRIMARY KEY,
+                tile_hash TEXT,
+                content_hash TEXT,
+                first_seen TEXT NOT NULL,
+                last_seen TEXT NOT NULL
+            );
+        ''')
+        self.run_id = None
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+    def start_run(self) -> int:
+        """Resume the last unfinished run or start a new one.
+        :return: ID of the run
+        """
+        row = self.connection.execute('SELECT id FROM runs WHERE finished_at IS NULL ORDER BY id DESC LIMIT 1').fetchone()
+        if row is not None:
+            self.run_id = row[0]
+            print(f"Resuming crawl run {self.run_id}.")
+        else:
+            with self.connection:
+                self.run_id = self.connection.execute('INSERT INTO runs (started_at) VALUES (?)', (self._now(),)).lastrowid
+        return self.run_id
+
+    def finish_run(self) -> None:
+        """Commit the pending checkpoints and mark the current run as finished, the next `start_run` will start from scratch."""
+        with self.connection:
+            self.connection.execute('UPDATE runs SET finished_at = ? WHERE id = ?', (self._now(), self.run_id))
+
+    def page_done(self, url: str) -> bool:
+        """Check whether the search page was already processed in the current run."""
+        return self.connection.execute('SELECT 1 FROM run_pages WHERE run_id = ? AND url = ?', (self.run_id, url)).fetchone() is not None
+
+    def mark_page_done(self, url: str, tiles: List[Tuple[str, str]]) -> None:
+        """Checkpoint a processed search page together with the offers found on it.
+        Offers whose tile didn't change since they were last fetched are marked as done right away.
+        :param url: URL of the search page
+        :param tiles: List of (offer link, tile hash) tuples found on the page
+        """
+        now = self._now()
+        with self.connection:
+            position = self.connection.execute('SELECT COUNT(*) FROM run_offers WHERE run_id = ?', (self.run_id,)).fetchone()[0]
+            for link, tile_hash in tiles:
+                known = self.connection.execute('SELECT tile_hash FROM offers WHERE url = ?', (link,)).fetchone()
+                unchanged = known is not None and known[0] == tile_hash
+                inserted = self.connection.execute(
+                    'INSERT OR IGNORE INTO run_offers (run_id, url, tile_hash, position, done) VALUES (?, ?, ?, ?, ?)',
+                    (self.run_id, link, tile_hash, position, int(unchanged))).rowcount
+                position += inserted
+                if unchanged:
+                    self.connection.execute('UPDATE offers SET last_seen = ? WHERE url = ?', (now, link))
+            self.connection.execute('INSERT OR IGNORE INTO run_pages (run_id, url, done_at) VALUES (?, ?, ?)', (self.run_id, url, now))
+
+    def pending_offers(self) -> List[Tuple[str, str]]:
+        """Return the offers of the current run which still have to be fetched, in discovery order.
+        :return: List of (offer link, tile hash) tuples
+        """
+        return self.connection.execute(
+            'SELECT url, tile_hash FROM run_offers WHERE run_id = ? AND done = 0 ORDER BY position', (self.run_id,)).fetchall()
+
+    def is_changed(self, url: str, offer_content_hash: str) -> bool:
+        """Check whether the parsed content of the offer differs from the last stored version."""
+        row = self.connection.execute('SELECT content_hash FROM offers WHERE url = ?', (url,)).fetchone()
+        return row is None or row[0] != offer_content_hash
+
+    def mark_offer_done(self, url: str, tile_hash: str, offer_content_hash: Optional[str]) -> None:
+        """Checkpoint a processed offer and remember its hashes for the next runs.
+        The checkpoint becomes durable on `commit`, which should be called once the offer is written to disk,
+        so offers still buffered by an output sink are fetched again after a crash.
+        :param url: URL of the offer
+        :param tile_hash: Hash of the offer tile on the search page
+        :param offer_content_hash: Hash of the parsed offer details, None if the offer could not be fetched
+        """
+        now = self._now()
+        if offer_content_hash is not None:
+            self.connection.execute('''
+                INSERT INTO offers (url, tile_hash, content_hash, first_seen, last_seen) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET tile_hash = excluded.tile_hash, content_hash = excluded.content_hash, last_seen = excluded.last_seen
+            ''', (url, tile_hash, offer_content_hash, now, now))
+        self.connection.execute('UPDATE run_offers SET done = 1 WHERE run_id = ? AND url = ?', (self.run_id, url))
+
+    def commit(self) -> None:
+        """Make the offer checkpoints recorded so far durable."""
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
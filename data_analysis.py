@@ -2,19 +2,24 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import seaborn as sns
+from typing import List, Optional
+from data_clearing import load_cleaned_data
+from cleaned_dataset import COLUMNS, dataset_path
+from aggregation_cube import cached_cube
+from file_hashing import file_hash
+from dataset_profile import profile, print_profile
 
 
-def load_data() -> pd.DataFrame:
-    """Function to load the cleaned and formatted data."""
-    return pd.read_csv('data_cleaned_formated.csv')
+def load_data(filepath: Optional[str] = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Function to load the cleaned and formatted data (Parquet dataset, CSV file or '.sqlite' listing store)."""
+    return load_cleaned_data(filepath, columns)
 
 
 def show_unique_values(df: pd.DataFrame, column: str) -> None:
-    """Function to show unique values and their counts in a column."""
-    # print(df[column].value_counts())
+    """Function to show unique values and their counts in a column (see `dataset_profile.py` for more columns)."""
     print(f"{'-' * 15} {column} {'-' * 15}")
-    for i in df[column].value_counts().index:
-        print(i, df[column].value_counts()[i])
+    for value, count in df[column].value_counts().items():
+        print(value, count)
     print()
 
 
@@ -27,19 +32,18 @@ def plot_data(df: pd.DataFrame, column: str) -> None:
 
 def price_area_stats_for_each_location() -> None:
     """Function to show the price and area statistics for each location."""
-     # For each location print max, min price and area
-    locations = df['location'].unique()
-    for location in locations:
+    # For each location print max, min price and area, read from the aggregation cube
+    stats = cube.query(['location'], measures=['price', 'area'], quantiles=[])
+    for location, row in stats.iterrows():
         print(f"{'-' * 15} {location} {'-' * 15}")
-        print(f"Max price: {df[df['location'] == location]['price'].max()}")
-        print(f"Min price: {df[df['location'] == location]['price'].min()}")
-        print(f"Max area: {df[df['location'] == location]['area'].max()}")
-        print(f"Min area: {df[df['location'] == location]['area'].min()}")
+        print(f"Max price: {row['price_max']}")
+        print(f"Min price: {row['price_min']}")
+        print(f"Max area: {row['area_max']}")
+        print(f"Min area: {row['area_min']}")
         print()
 
     plt.figure(figsize=(10, 6))
-    for location in locations:
-        sns.scatterplot(data=df[df['location'] == location], x='area', y='price', label=location)
+    sns.scatterplot(data=df, x='area', y='price', hue='location')
     plt.title('Price vs Area for each location')
     plt.legend()
     plt.show()
@@ -72,22 +76,26 @@ def general_data_analysis_seaborn():
     plt.show()
 
     plt.figure(figsize=(10, 6))
-    sns.histplot(data=df, x='price_per_m2', bins=30, kde=True)
-    plt.title('Price per m2 distribution')
+    sns.histplot(data=df, x='building_age', bins=30, kde=True)
+    plt.title('Building age distribution')
     plt.show()
 
     plt.figure(figsize=(10, 6))
-    sns.histplot(data=df, x='price_per_m2', bins=30, kde=True)
+    sns.histplot(data=df, x='floor_ratio', bins=10, kde=True)
+    plt.title('Floor ratio distribution')
+    plt.show()
 
 if __name__ == '__main__':
-    df = load_data()
+    # The derived columns used by the charts are read with the cleaned ones
+    df = load_data(columns=COLUMNS + ['price_per_m2', 'building_age', 'floor_ratio'])
 
     print(df.head(5))
+    # Statistics by district, rooms, decade and market, built once per version of the dataset
+    cube = cached_cube(df, file_hash(dataset_path()))
 
 
     columns_to_show = ['location', 'rooms', 'floor', 'year', 'parking', 'state', 'furnished', 'market']
-    for element in columns_to_show:
-        show_unique_values(df, element)
+    print_profile(profile(df, columns_to_show))
 
     columns_to_exclude = ['year', 'state']
     for element in columns_to_show:
@@ -1,36 +1,150 @@
+import argparse
+import io
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+import numpy as np
 import ast
-from typing import Optional
+from typing import Callable, Iterator, List, Optional, Tuple
+from offer_sink import load_offers, iter_offers
+from listing_store import LISTINGS_PATH, ListingStore, open_store, stored_rows
+from gazetteer import offer_location, resolve_districts
+from cleaned_dataset import DatasetWriter, apply_schema, dataset_path, read_dataset, write_dataset
+from derived_features import DERIVED_COLUMNS, add_derived, source_columns
+from data_validation import MISSING_VALUES, check, missing_values, reason_codes, standardize_state
+from deduplication import deduplicate, cluster_statistics
+from snapshot_history import SnapshotHistory
 
+# Structured offer records (see `offer_sink.py`) use the scraper field names
+OFFER_COLUMNS = {'title': 'location', 'details': 'detailed_info', 'interest_level': 'call'}
 
-def extract_information() -> None:
-    """Function to extract information from the `basic_info` and `detailed_info` columns.
-    1. Extract the number of rooms, floor, total floors, year, parking, and state from the `basic_info` column.
-    2. Extract the furnished and market information from the `detailed_info` column.
-    3. Drop unnecessary columns.
-    4. Save the cleaned data to a new CSV file.
+
+def load_raw_offers(filepath: str) -> pd.DataFrame:
+    """Load scraped offers with the column names used by the cleaning stage.
+    CSV files hold `basic_info` and `detailed_info` as strings, JSON Lines and Parquet files
+    written by an `OfferSink` hold them as lists and dictionaries which don't need to be parsed again.
+    :param filepath: Path to the scraped offers ('.csv', '.jsonl', '.parquet' or a '.sqlite' listing store)
+    :return: DataFrame of offers
     """
-    
-    # Load data
-    data = pd.read_csv('offer_details.csv')
-
-    # Function to extract information from the `basic_info` column
-    def extract_from_basic_info(info: str, key: str) -> Optional[str]:
-        try:
-            info_dict = ast.literal_eval(info)
-            for item in info_dict:
-                if key in item:
-                    return item.split(': ')[1].strip()
-        except (ValueError, SyntaxError):
-            return None
-
-    # Function to extract information from the `detailed_info` column
-    def extract_from_detailed_info(info: str, key: str) -> str:
-        try:
-            info_dict = ast.literal_eval(info.replace('\xa0', ' '))
-            return info_dict.get(key, 'N/A')
-        except (ValueError, SyntaxError):
-            return 'N/A'
+    if filepath.endswith('.csv'):
+        return pd.read_csv(filepath)
+    data = load_offers(filepath).rename(columns=OFFER_COLUMNS)
+    return data.drop(columns=['url', 'scraped_at'])
+
+
+def default_raw_path() -> str:
+    """Return the scraped offers to clean: the listing store if it holds offers, otherwise `offer_details.csv`."""
+    return LISTINGS_PATH if stored_rows(LISTINGS_PATH) else 'offer_details.csv'
+
+
+def raw_city(filepath: str) -> str:
+    """Return the city of scraped offers: the city of a shard of `multi_city_crawl.py` (`city=<name>` directory),
+    otherwise Wrocław."""
+    match = re.search(r'city=([^/\\]+)', filepath)
+    return match.group(1) if match else 'wroclaw'
+
+
+def iter_raw_offers(filepath: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Load scraped offers like `load_raw_offers`, but in chunks of at most `chunksize` rows.
+    :param filepath: Path to the scraped offers ('.csv', '.jsonl', '.parquet' or a '.sqlite' listing store)
+    :param chunksize: Number of offers per chunk
+    :return: Iterator of DataFrames
+    """
+    if filepath.endswith('.csv'):
+        yield from pd.read_csv(filepath, chunksize=chunksize)
+        return
+    for data in iter_offers(filepath, chunksize):
+        yield data.rename(columns=OFFER_COLUMNS).drop(columns=['url', 'scraped_at'])
+
+
+def load_cleaned_data(filepath: Optional[str] = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Load the cleaned and formatted dataset with the column types of `cleaned_dataset.SCHEMA`.
+    :param filepath: Path to the Parquet dataset, a cleaned CSV file or a listing store ('.sqlite') filled by
+        `location_to_district`, by default the dataset in the current directory (see `cleaned_dataset.dataset_path`)
+    :param columns: Columns to load, only these are read from a Parquet file or a listing store; derived columns
+        (see `derived_features.py`) are read from the Parquet file or computed from the columns they depend on
+    :return: DataFrame of cleaned offers
+    """
+    filepath = filepath or dataset_path()
+    if filepath.endswith('.parquet'):
+        return read_dataset(filepath, columns)
+    sources = None if columns is None else source_columns(columns)
+    if filepath.endswith('.sqlite'):
+        with open_store(filepath, 'cleaned_listings') as store:
+            data = apply_schema(store.read_cleaned(columns=sources))
+    else:
+        data = apply_schema(pd.read_csv(filepath, usecols=sources))
+    return data if columns is None else add_derived(data, [column for column in columns if column in DERIVED_COLUMNS])[columns]
+
+
+# Keys of the `basic_info` entries, in the order of the extracted columns
+BASIC_INFO_KEYS = ['Liczba pokoi', 'Piętro', 'Rok budowy', 'Miejsce parkingowe', 'Stan mieszkania']
+BASIC_INFO_COLUMNS = ['rooms', 'floor', 'total_floors', 'year', 'parking', 'state']
+# 'single_pass' parses every cell once, 'legacy' is the original per-key extraction kept as a reference
+EXTRACTION_ENGINE = 'single_pass'
+
+
+def extract_from_basic_info(info: str | list, key: str) -> Optional[str]:
+    """Extract the value of a single key from a `basic_info` cell (legacy engine)."""
+    try:
+        info_dict = info if isinstance(info, list) else ast.literal_eval(info)
+        for item in info_dict:
+            if key in item:
+                return item.split(': ')[1].strip()
+    except (ValueError, SyntaxError):
+        return None
+
+
+def extract_from_detailed_info(info: str | dict, key: str) -> str:
+    """Extract the value of a single key from a `detailed_info` cell."""
+    try:
+        if isinstance(info, dict):
+            return info.get(key, 'N/A').replace('\xa0', ' ')
+        info_dict = ast.literal_eval(info.replace('\xa0', ' '))
+        return info_dict.get(key, 'N/A')
+    except (ValueError, SyntaxError):
+        return 'N/A'
+
+
+def parse_basic_info(info: str | list) -> tuple:
+    """Parse a `basic_info` cell once and extract all `BASIC_INFO_COLUMNS`.
+    Every key takes the value of the first entry containing it, like `extract_from_basic_info`.
+    :param info: List of 'Key: value' strings or its string representation
+    :return: Tuple of rooms, floor, total floors, year, parking and state (None if missing)
+    """
+    try:
+        items = info if isinstance(info, list) else ast.literal_eval(info)
+    except (ValueError, SyntaxError):
+        return (None,) * len(BASIC_INFO_COLUMNS)
+    values = dict.fromkeys(BASIC_INFO_KEYS)
+    for item in items:
+        for key in BASIC_INFO_KEYS:
+            if values[key] is None and key in item:
+                values[key] = item.split(': ')[1].strip()
+    rooms, floor_info, year, parking, state = values.values()
+    floor, total_floors = None, None
+    if floor_info:
+        floor_parts = floor_info.split(' / ')
+        floor = floor_parts[0]
+        total_floors = floor_parts[1] if '/' in floor_info and len(floor_parts) > 1 else None
+    return rooms, floor, total_floors, year, parking, state
+
+
+def extract_columns(data: pd.DataFrame, engine: str = EXTRACTION_ENGINE) -> pd.DataFrame:
+    """Add the columns extracted from `basic_info` and `detailed_info` to the raw offers.
+    :param data: Raw offers (see `load_raw_offers`)
+    :param engine: 'single_pass' or 'legacy'
+    :return: The same DataFrame with the extracted columns
+    """
+    if engine == 'single_pass':
+        basic_info = pd.DataFrame(list(map(parse_basic_info, data['basic_info'])), index=data.index, columns=BASIC_INFO_COLUMNS)
+        for column in BASIC_INFO_COLUMNS:
+            data[column] = basic_info[column]
+        data['furnished'] = data['detailed_info'].apply(lambda x: 'Tak' if 'umeblowane' in str(x) else 'Nie')
+        data['market'] = data['detailed_info'].apply(lambda x: extract_from_detailed_info(x, 'Rynek'))
+        return data
 
     # Extracting information from the `basic_info` and `detailed_info` columns
     data['rooms'] = data['basic_info'].apply(lambda x: extract_from_basic_info(x, 'Liczba pokoi'))
@@ -40,8 +154,26 @@ def extract_information() -> None:
     data['parking'] = data['basic_info'].apply(lambda x: extract_from_basic_info(x, 'Miejsce parkingowe'))
     data['state'] = data['basic_info'].apply(lambda x: extract_from_basic_info(x, 'Stan mieszkania'))
 
-    data['furnished'] = data['detailed_info'].apply(lambda x: 'Tak' if 'umeblowane' in x else 'Nie')
+    data['furnished'] = data['detailed_info'].apply(lambda x: 'Tak' if 'umeblowane' in str(x) else 'Nie')
     data['market'] = data['detailed_info'].apply(lambda x: extract_from_detailed_info(x, 'Rynek'))
+    return data
+
+
+def extract_information(filepath: str = 'offer_details.csv', engine: str = EXTRACTION_ENGINE) -> None:
+    """Function to extract information from the `basic_info` and `detailed_info` columns.
+    1. Extract the number of rooms, floor, total floors, year, parking, and state from the `basic_info` column.
+    2. Extract the furnished and market information from the `detailed_info` column.
+    3. Drop unnecessary columns.
+    4. Save the cleaned data to a new CSV file.
+    :param filepath: Path to the scraped offers ('.csv', '.jsonl', '.parquet' or a '.sqlite' listing store)
+    :param engine: Extraction engine, 'single_pass' or 'legacy'
+    """
+    
+    # Load data
+    data = load_raw_offers(filepath)
+
+    # Extracting information from the `basic_info` and `detailed_info` columns
+    data = extract_columns(data, engine)
 
     # Dropping unnecessary columns
     data.drop(['basic_info', 'detailed_info', 'call'], axis=1, inplace=True)
@@ -51,27 +183,100 @@ def extract_information() -> None:
     print(data.head())
 
 
-def clear_format_data() -> None:
-    """Function to format the dataset.
-    1. Remove missing values.
-    2. Change 'parter' to 0 in the 'floor' column.
-    3. Set all values to the correct data types.
-    4. Save the cleaned and formatted data to a new CSV file.
+# 'vectorized' formats whole columns at once, 'legacy' is the original row-wise formatting kept as a reference
+FORMAT_ENGINE = 'vectorized'
+# Offers failing the validation rules (see `data_validation.py`) with their reason codes
+QUARANTINE_PATH = 'data_quarantine.csv'
+# Clusters of near-duplicate offers (see `deduplication.py`), only the canonical offer of a cluster is kept
+DUPLICATES_PATH = 'data_duplicates.csv'
+# Columns converted to whole numbers after the validation
+INTEGER_COLUMNS = ['rooms', 'floor', 'total_floors', 'year']
+
+
+def map_unique(column: pd.Series, function: Callable) -> np.ndarray:
+    """Apply a function to every distinct value of a column only once and map the results back via the category codes.
+    :param column: Column without missing values
+    :param function: Function of a single value
+    :return: Array of results aligned with the column
     """
-    
-    # Load cleared data
-    data = pd.read_csv('data_cleaned.csv')
+    codes, uniques = pd.factorize(column)
+    return np.array([function(value) for value in uniques])[codes]
 
-    # Basic information about the dataset
-    print(data.info())
 
-    # Check for missing values
-    data_clean = data.dropna()
-    data_clean = data_clean[~data_clean.isin(['-', 'N/A', 'N/A ']).any(axis=1)]
+def parse_numbers(column: pd.Series) -> np.ndarray:
+    """Parse a column of numbers given as text once per distinct value, values which aren't numbers become NaN.
+    :param column: Column of numbers as text
+    :return: Array of floats aligned with the column
+    """
+    codes, uniques = pd.factorize(column)
+    numbers = pd.to_numeric(pd.Series(uniques, dtype=object), errors='coerce').to_numpy(dtype=float)
+    return np.append(numbers, np.nan)[codes]
+
+
+def format_data(data: pd.DataFrame, engine: str = FORMAT_ENGINE) -> pd.DataFrame:
+    """Remove invalid offers and convert the columns to their final types and categories (see `validate_format_data`).
+    :param data: Output of `extract_information`
+    :param engine: 'vectorized' or 'legacy'
+    :return: Formatted offers
+    """
+    return validate_format_data(data, engine)[0]
 
-    # Display the number of records after removing missing values
-    print(f"Number of records after removing missing data: {len(data_clean)}")
 
+def validate_format_data(data: pd.DataFrame, engine: str = FORMAT_ENGINE) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Convert the columns to their final types and categories and validate the offers against the rules of
+    `data_validation.py`: missing values, unparseable numbers, ranges, allowed categories and `floor <= total_floors`.
+    The vectorized engine converts unparseable values to NaN, so malformed offers end up in the quarantine
+    instead of aborting the run. The legacy engine formats only offers without missing values and raises on them.
+    :param data: Output of `extract_information`
+    :param engine: 'vectorized' or 'legacy'
+    :return: Valid formatted offers and the quarantined input offers with their reason codes in `reasons`
+    """
+    missing = missing_values(data)
+    if engine == 'legacy':
+        complete = ~missing.any(axis=1)
+        data_clean = _format_data_legacy(data[complete].copy())
+        failures = check(data_clean, missing[complete])
+        failures = pd.concat([failures, missing[~complete].add_suffix(':missing').reindex(columns=failures.columns, fill_value=False)])
+        failures = failures.loc[data.index]
+    else:
+        data_clean = _format_data_vectorized(data)
+        failures = check(data_clean, missing)
+
+    failed = failures.any(axis=1)
+    quarantine = data[failed].assign(reasons=reason_codes(failures))
+    data_clean = data_clean[~failed[data_clean.index]]
+    for column in INTEGER_COLUMNS:
+        data_clean[column] = data_clean[column].astype(int)
+    return data_clean, quarantine
+
+
+def _format_data_vectorized(data: pd.DataFrame) -> pd.DataFrame:
+    """Vectorized formatting of all offers, values which can't be converted are set to NaN."""
+    data_clean = data.copy()
+    # All columns are parsed as text, a column read from a partition whose cells are all empty is a float column
+    for column in data_clean.columns:
+        if not pd.api.types.is_string_dtype(data_clean[column]):
+            data_clean[column] = data_clean[column].astype(str).where(data_clean[column].notna())
+    data_clean['floor'] = data_clean['floor'].mask(data_clean['floor'] == 'parter', 0)
+    data_clean['price'] = parse_numbers(data_clean['price'].str.replace(' zł| ', '', regex=True).str.replace(',', '.'))
+    data_clean['area'] = parse_numbers(data_clean['area'].str.replace(' m²| ', '', regex=True).str.replace(',', '.'))
+    for column in INTEGER_COLUMNS:
+        data_clean[column] = parse_numbers(data_clean[column])
+
+    # Second part of titles with four comma-separated parts, otherwise the first part (see `gazetteer.offer_location`)
+    location = data_clean['location'].str.replace(r'^[^,]*,([^,]*),[^,]*,[^,]*$', r'\1', regex=True)
+    data_clean['location'] = location.str.replace(r'(?s),.*', '', regex=True).str.strip()
+
+    # Low-cardinality text columns are lowercased and matched once per distinct value, missing ones are quarantined
+    data_clean['parking'] = map_unique(data_clean['parking'].fillna(''), lambda x: 1 if 'tak' in x.lower() or 'garaż' in x.lower() else 0)
+    data_clean['state'] = map_unique(data_clean['state'].fillna(''), standardize_state)
+    data_clean['furnished'] = map_unique(data_clean['furnished'].fillna(''), lambda x: 1 if 'tak' in x.lower() else 0)
+    data_clean['market'] = map_unique(data_clean['market'].fillna(''), lambda x: 'primary' if 'pierwotny' in x.lower() else 'secondary')
+    return data_clean
+
+
+def _format_data_legacy(data_clean: pd.DataFrame) -> pd.DataFrame:
+    """Row-wise formatting of `format_data`."""
     # Change 'parter' to 0 in the 'floor' column
     data_clean['floor'] = data_clean['floor'].apply(lambda x: 0 if x == 'parter' else x)
 
@@ -84,19 +289,52 @@ def clear_format_data() -> None:
     data_clean['year'] = data_clean['year'].astype(int)
 
     # Change location to district only
-    data_clean['location'] = data_clean['location'].apply(lambda x: x.split(',')[1].strip() if len(x.split(',')) == 4 else x.split(',')[0].strip())
+    data_clean['location'] = data_clean['location'].apply(offer_location)
 
     # Change parking to 1 if 'tak' or "garaż" else 0
     data_clean['parking'] = data_clean['parking'].apply(lambda x: 1 if 'tak' in x.lower() or 'garaż' in x.lower() else 0)
 
     # Map state values to standardized categories
-    data_clean['state'] = data_clean['state'].apply(lambda x: 'bardzo dobry' if 'wysoki standard' in x.lower() or 'nowe wykończone' in x.lower() else 'do remontu' if 'do odświeżenia' in x.lower() else x)
+    data_clean['state'] = data_clean['state'].apply(standardize_state)
 
     # Change furnished to 1 if 'tak' else 0
     data_clean['furnished'] = data_clean['furnished'].apply(lambda x: 1 if 'tak' in x.lower() else 0)
 
     # Change market to primary or secondary
     data_clean['market'] = data_clean['market'].apply(lambda x: 'primary' if 'pierwotny' in x.lower() else 'secondary')
+    return data_clean
+
+
+def clear_format_data(engine: str = FORMAT_ENGINE, remove_duplicates: bool = False, city: str = 'wroclaw') -> None:
+    """Function to format the dataset.
+    1. Change 'parter' to 0 in the 'floor' column.
+    2. Set all values to the correct data types.
+    3. Validate the offers, offers with missing or invalid values are saved to the quarantine file with reason codes.
+    4. Optionally keep one offer of every cluster of near-duplicates, the clusters are saved to the duplicates file.
+    5. Save the cleaned and formatted data to a new CSV file.
+    :param engine: Formatting engine, 'vectorized' or 'legacy'
+    :param remove_duplicates: Remove near-duplicate offers
+    :param city: City of the offers, near-duplicates have to be in the same of its districts
+    """
+    
+    # Load cleared data
+    data = pd.read_csv('data_cleaned.csv')
+
+    # Basic information about the dataset
+    print(data.info())
+
+    data_clean, quarantine = validate_format_data(data, engine)
+
+    # Display the number of records after removing invalid data and the most common reasons
+    print(f"Number of records after removing missing data: {len(data_clean)}")
+    print(f"Quarantined {len(quarantine)} records:")
+    print(quarantine['reasons'].str.split(';').explode().value_counts().head(10))
+    quarantine.to_csv(QUARANTINE_PATH, index=False)
+
+    if remove_duplicates:
+        data_clean, duplicates = deduplicate(data_clean, data.loc[data_clean.index, 'location'], city=city)
+        print(f"Removed near-duplicates: {cluster_statistics(duplicates)}")
+        duplicates.to_csv(DUPLICATES_PATH, index_label='row')
 
     # Save cleaned and formatted data to a new CSV file
     data_clean.to_csv('data_cleaned_formated.csv', index=False)
@@ -105,44 +343,154 @@ def clear_format_data() -> None:
     print(data_clean.head())
 
 
-def location_to_district() -> None:
+def location_to_district(store_path: Optional[str] = None, city: str = 'wroclaw') -> None:
     """Function to change the location to the district only.
     1. If the location is split by a comma and the length is 4, take the second element.
     2. If the location is split by a comma and the length is not 4, take the first element.
-    3. Save the cleaned data to a new CSV file.
+    3. Save the cleaned data to a new CSV file, to the Parquet dataset and, if given, to the listing store.
+    :param store_path: Path to the listing store ('.sqlite') read by `load_cleaned_data`
+    :param city: City of the offers, its gazetteer resolves the districts
     """
     
     # Load cleaned and formatted data
     data = pd.read_csv('data_cleaned_formated.csv')
 
-    # Define districts and their corresponding locations
-    districts = {
-        "Stare Miasto": ["Stare Miasto", "Ołbin", "Wrocław", "Świdnicka", "Więzienna", "Nożownicza", "Włodkowica"],
-        "Krzyki": ["Krzyki", "Partynice", "Wojszyce", "Klecina", "Borek", "Tarnogaj", "Oporów", "Jagodno", "Gaj", "Krzyk", "Księże Małe", "Księże Wielkie", "Poświętne", "Ołtaszyn", "Przedmieście Oławskie"],
-        "Fabryczna": ["Fabryczna", "Grabiszyn", "Grabiszyn-Grabiszynek", "Muchobór Wielki", "Nowy Dwór", "Fabryczna", "Gądów Mały", "Gądów-Popowice Południowe", "Muchobór Mały", "Pilczyce", "Żerniki", "Maślice", "Stabłowice", "Zakrzów"],
-        "Psie Pole": ["Psie Pole", "Swojczyce", "Różanka", "Kowale", "Sołtysowice", "Osobowice", "Karłowice", "Kleczków", "Lipa Piotrowska", "Popowice", "Kępa Mieszczańska", "Brochów", "Bieńkowice", "Szczepin"],
-        "Śródmieście": ["Nadodrze", "Śródmieście", "Plac Grunwaldzki", "Huby", "Przedmieście Świdnickie", "Zaporoska"]
-    }
-
-    # Function to find the district based on location
-    def find_district(location: str) -> str:
-        for district, locations in districts.items():
-            if location in locations:
-                return district
-        return "Inne"
-
-    data['location'] = data['location'].apply(find_district)
+    data['location'] = resolve_districts(data['location'], city)
 
     print(data['location'].value_counts())
 
     # Save the cleaned data to a new CSV file
     data.to_csv('data_cleaned_formated.csv', index=False)
+    write_dataset(data)
+    if store_path is not None:
+        with ListingStore(store_path) as store:
+            store.write_cleaned(data)
+
+
+def clean_partition(data: pd.DataFrame, extraction_engine: str = EXTRACTION_ENGINE, format_engine: str = FORMAT_ENGINE,
+                    remove_duplicates: bool = False,
+                    city: str = 'wroclaw') -> Tuple[str, str, str, Optional[str], pd.DataFrame]:
+    """Run all cleaning steps on a partition of the raw offers.
+    Partitions are cleaned independently, so they can be cleaned in any process and concatenated in input order;
+    near-duplicates are only found within a partition.
+    The extracted columns go through CSV parsing before formatting, like `clear_format_data` reading `data_cleaned.csv`.
+    :param data: Raw offers (see `load_raw_offers`)
+    :param extraction_engine: Extraction engine, 'single_pass' or 'legacy'
+    :param format_engine: Formatting engine, 'vectorized' or 'legacy'
+    :param remove_duplicates: Remove near-duplicate offers
+    :param city: City of the offers, its gazetteer resolves the districts
+    :return: Extracted, cleaned, quarantined and duplicate offers as CSV (all with a header, no duplicates without
+        `remove_duplicates`) and the cleaned offers
+    """
+    index = data.index
+    data = extract_columns(data, extraction_engine)
+    data.drop(['basic_info', 'detailed_info', 'call'], axis=1, inplace=True)
+    extracted_csv = data.to_csv(index=False)
+    extracted = pd.read_csv(io.StringIO(extracted_csv)).set_axis(index)
+    data_clean, quarantine = validate_format_data(extracted, format_engine)
+    duplicates_csv = None
+    if remove_duplicates:
+        # The report has the columns of the offers also without duplicates, so every partition has the same header
+        data_clean, duplicates = deduplicate(data_clean, extracted.loc[data_clean.index, 'location'], city=city)
+        duplicates_csv = duplicates.to_csv(index_label='row')
+    data_clean['location'] = resolve_districts(data_clean['location'], city)
+    return (extracted_csv, data_clean.to_csv(index=False), quarantine.to_csv(index=False), duplicates_csv, data_clean)
+
+
+def clean_chunked(filepath: str = 'offer_details.csv', chunksize: int = 100_000, store_path: Optional[str] = None,
+                  workers: int = 1, extraction_engine: str = EXTRACTION_ENGINE, format_engine: str = FORMAT_ENGINE,
+                  remove_duplicates: bool = False, city: str = 'wroclaw') -> None:
+    """Streaming, optionally parallel variant of `extract_information`, `clear_format_data` and `location_to_district`.
+    The raw offers are read in partitions of `chunksize` rows, cleaned by `clean_partition` and appended to
+    `data_cleaned.csv`, `data_cleaned_formated.csv`, the quarantine and (with `remove_duplicates`) duplicates files,
+    the Parquet dataset and, if given, the listing store in input order, so the output is deterministic and the same
+    as the one written by the in-memory functions, except for near-duplicates in different partitions which are
+    both kept.
+    With more than one worker the partitions are cleaned in a process pool, at most two partitions per worker are
+    in flight to bound memory use.
+    :param filepath: Path to the scraped offers ('.csv', '.jsonl', '.parquet' or a '.sqlite' listing store)
+    :param chunksize: Number of offers per partition
+    :param store_path: Path to the listing store ('.sqlite') receiving the cleaned dataset
+    :param workers: Number of worker processes, 1 cleans in the current process
+    :param extraction_engine: Extraction engine, 'single_pass' or 'legacy'
+    :param format_engine: Formatting engine, 'vectorized' or 'legacy'
+    :param remove_duplicates: Remove near-duplicate offers within every partition
+    :param city: City of the offers, its gazetteer resolves the districts
+    """
+    counts = {'extracted': 0, 'formatted': 0, 'partitions': 0}
+    store = ListingStore(store_path) if store_path is not None else None
+    dataset = DatasetWriter()
+
+    def write(data: pd.DataFrame, result: Tuple[str, str, str, Optional[str], pd.DataFrame]) -> None:
+        *csvs, data_clean = result
+        first = counts['partitions'] == 0
+        for path, content in zip(['data_cleaned.csv', 'data_cleaned_formated.csv', QUARANTINE_PATH, DUPLICATES_PATH], csvs):
+            if content is None:
+                continue
+            with open(path, 'w' if first else 'a', newline='', encoding='utf-8') as f:
+                f.write(content if first else content.split('\n', 1)[1])
+        dataset.write(data_clean)
+        if store is not None:
+            store.write_cleaned(data_clean, append=not first)
+        counts['extracted'] += len(data)
+        counts['formatted'] += len(data_clean)
+        counts['partitions'] += 1
+
+    try:
+        if workers <= 1:
+            for data in iter_raw_offers(filepath, chunksize):
+                write(data, clean_partition(data, extraction_engine, format_engine, remove_duplicates, city))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                in_flight = deque()
+                for data in iter_raw_offers(filepath, chunksize):
+                    in_flight.append((data, pool.submit(clean_partition, data, extraction_engine, format_engine,
+                                                          remove_duplicates, city)))
+                    if len(in_flight) >= 2 * workers:
+                        data, future = in_flight.popleft()
+                        write(data, future.result())
+                while in_flight:
+                    data, future = in_flight.popleft()
+                    write(data, future.result())
+    finally:
+        dataset.close()
+        if store is not None:
+            store.close()
+    if not counts['partitions']:
+        print("No offers to clean.")
+        return
+    print(f"Extracted {counts['extracted']} offers, {counts['formatted']} offers left after removing missing data.")
 
 
 if __name__ == '__main__':
-    extract_information()
-    clear_format_data()
-    location_to_district()
-    df = pd.read_csv('data_cleaned_formated.csv')
+    parser = argparse.ArgumentParser(description='Clean the scraped offers into the cleaned dataset.')
+    parser.add_argument('--raw', default=None, help="Scraped offers, by default the listing store if it holds offers, "
+                                                     "otherwise 'offer_details.csv'")
+    parser.add_argument('--chunked', action='store_true',
+                        help="Clean in partitions with constant memory, for datasets which don't fit in memory")
+    parser.add_argument('--chunksize', type=int, default=100_000, help='Offers per partition of the chunked mode')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes cleaning partitions in parallel in the chunked mode')
+    parser.add_argument('--remove-duplicates', action='store_true', help='Remove near-duplicate offers')
+    parser.add_argument('--city', default=None, help="City of the offers whose gazetteer resolves the districts, by "
+                                                      "default the city of a multi-city crawl shard or 'wroclaw'")
+    parser.add_argument('--snapshot', action='store_true',
+                        help='Keep the cleaned offers in the snapshot history and update the price index per district')
+    args = parser.parse_args()
+    raw_path = args.raw or default_raw_path()
+    city = args.city or raw_city(raw_path)
+    # The cleaned dataset is also written to the listing store if the offers come from it
+    store_path = raw_path if raw_path.endswith('.sqlite') else None
+    if args.chunked:
+        clean_chunked(raw_path, chunksize=args.chunksize, store_path=store_path, workers=args.workers,
+                      remove_duplicates=args.remove_duplicates, city=city)
+    else:
+        extract_information(raw_path)
+        clear_format_data(remove_duplicates=args.remove_duplicates, city=city)
+        location_to_district(store_path, city)
+    df = load_cleaned_data(store_path)
+    if args.snapshot:
+        with SnapshotHistory() as history:
+            history.add_snapshot(df)
     print(df.info())
     print(df.head())
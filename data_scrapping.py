@@ -1,112 +1,302 @@
 import requests
 from bs4 import BeautifulSoup
-import pandas as pd
 import time
-from typing import List, Dict, Union, Optional
+import hashlib
+import re
+from typing import List, Dict, Union, Optional, Tuple
+from page_archive import PageArchive
+from crawl_state import CrawlState, content_hash
+import fast_extraction
+from offer_sink import OfferSink, CsvSink, open_sink
+from rate_limiter import AdaptiveRateLimiter
+from scrape_metrics import ScrapeMetrics, timed_parse
 
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+}
+SEARCH_URL = "https://wroclaw.nieruchomosci-online.pl/szukaj.html?3,mieszkanie,sprzedaz,,Wrocław:17876&p={}&q=%7B%7D"
+SEARCH_PAGES = 180
+# 'lxml' uses the fast path from `fast_extraction.py`, 'bs4' the reference BeautifulSoup extraction
+EXTRACTION_ENGINE = 'lxml'
 
-def get_offers(web_site_content: str) -> List[str]:
+
+def search_pages(universal_url: str = SEARCH_URL, pages: int = SEARCH_PAGES) -> List[str]:
+    """Build the list of search result page URLs.
+    :param universal_url: Search URL with a `{}` placeholder for the page number
+    :param pages: Number of search result pages
+    :return: List of search page URLs
+    """
+    return [universal_url.format(i) for i in range(1, pages + 1)]
+
+
+def get_offers(web_site_content: str, engine: str = EXTRACTION_ENGINE) -> List[str]:
     """Get offer links from the website.
     :param web_site_content: HTML content of the website
+    :param engine: Extraction engine, 'lxml' or 'bs4'
     :return: List of offer links
     """
+    if engine == 'lxml':
+        return fast_extraction.get_offers(web_site_content)
     soup = BeautifulSoup(web_site_content, 'html.parser')
     offers = soup.find_all('div', class_=lambda value: value and value.startswith('tile tile-tile'))[:-1]
-    offer_links = [offer.find('a', class_='tabCtrl')['href'] for offer in offers if offer.find('a', class_='tabCtrl')]
+    links = (offer.find('a', class_='tabCtrl') for offer in offers)
+    offer_links = [link['href'] for link in links if link]
     return offer_links
 
 
-def scrape_offer_details(url: str) -> Optional[Dict[str, str | List[str] | Dict[str, str]]]:
+def get_offer_tiles(web_site_content: str, engine: str = EXTRACTION_ENGINE) -> List[Tuple[str, str]]:
+    """Get offer links together with a hash of the offer tile shown on the search page.
+    The tile contains the price and the basic parameters, so a changed hash means the offer has to be fetched again.
+    :param web_site_content: HTML content of the website
+    :param engine: Extraction engine, 'lxml' or 'bs4'
+    :return: List of (offer link, tile hash) tuples
+    """
+    if engine == 'lxml':
+        return fast_extraction.get_offer_tiles(web_site_content)
+    soup = BeautifulSoup(web_site_content, 'html.parser')
+    offers = soup.find_all('div', class_=lambda value: value and value.startswith('tile tile-tile'))[:-1]
+    tiles = []
+    for offer in offers:
+        link = offer.find('a', class_='tabCtrl')
+        if link:
+            tile_text = ' '.join(offer.get_text(separator=' ').split())
+            tiles.append((link['href'], hashlib.sha1(tile_text.encode('utf-8')).hexdigest()))
+    return tiles
+
+
+def get_page_count(web_site_content: Union[str, bytes], engine: str = EXTRACTION_ENGINE) -> int:
+    """Get the number of search result pages from the pagination of a search page.
+    :param web_site_content: HTML content of the first search page
+    :param engine: Extraction engine, 'lxml' or 'bs4'
+    :return: Number of search result pages, 1 if the page has no pagination
+    """
+    if engine == 'lxml':
+        return fast_extraction.get_page_count(web_site_content)
+    soup = BeautifulSoup(web_site_content, 'html.parser')
+    numbers = []
+    for pagination in soup.find_all('div', class_='pagination'):
+        for link in pagination.find_all('a', href=True):
+            match = re.search(r'[?&]p=(\d+)', link['href'])
+            if match:
+                numbers.append(int(match.group(1)))
+    return max(numbers, default=1)
+
+
+def scrape_offer_details(url: str, archive: Optional[PageArchive] = None, limiter: Optional[AdaptiveRateLimiter] = None,
+                         metrics: Optional[ScrapeMetrics] = None) -> Optional[Dict[str, str | List[str] | Dict[str, str]]]:
     """Scrape offer details from the website.
     :param url: URL of the offer page
+    :param archive: Archive of fetched pages, used for revalidation and storing the page
+    :param limiter: Shared rate limiter
+    :param metrics: Crawl metrics
     :return: Dictionary of offer details
     """
-    content = open_website(url)
+    content = open_website(url, archive=archive, kind='offer', limiter=limiter, metrics=metrics)
     if content is not None:
-        soup = BeautifulSoup(content, 'html.parser')
-
-        title = soup.find('h2', class_='header-e').text.strip() if soup.find('h2', class_='header-e') else 'Not provided'
-        primary_price = soup.find('span', class_='info-primary-price').text.strip().replace('\xa0', ' ') if soup.find('span', class_='info-primary-price') else 'Not provided'
-        area = soup.find('span', class_='info-area').text.strip().replace('\xa0', ' ') if soup.find('span', class_='info-area') else 'Not provided'
-        interest_level = soup.find('p', class_='par-a').text.strip() if soup.find('p', class_='par-a') else 'Not provided'
-
-        basic_info = soup.find_all('div', class_='box__attributes--content')
-        basic_info = [info.get_text(separator=" ").strip() for info in basic_info]
-
-        details_lists = soup.find_all('ul', class_=lambda value: value and value.startswith('list-h'))
-        details = {}
-        for details_list in details_lists:
-            for li in details_list.find_all('li'):
-                key = li.find('strong').text.strip().rstrip(':') if li.find('strong') else None
-                value = li.find('span').text.strip() if li.find('span') else 'Not provided'
-                if key:
-                    details[key] = value
-
-        offer_details = {
-            'title': title,
-            'price': primary_price,
-            'area': area,
-            'interest_level': interest_level,
-            'basic_info': basic_info,
-            'details': details
-        }
-        return offer_details
+        return timed_parse(metrics, 'offer', parse_offer_details, content)
     return None
 
 
+def parse_offer_details(content: Union[str, bytes], engine: str = EXTRACTION_ENGINE) -> Dict[str, str | List[str] | Dict[str, str]]:
+    """Parse offer details from the HTML content of an offer page.
+    :param content: HTML content of the offer page
+    :param engine: Extraction engine, 'lxml' or 'bs4'
+    :return: Dictionary of offer details
+    """
+    if engine == 'lxml':
+        return fast_extraction.parse_offer_details(content)
+    soup = BeautifulSoup(content, 'html.parser')
+
+    def first_text(name: str, class_: str) -> str:
+        element = soup.find(name, class_=class_)
+        return element.text.strip() if element else 'Not provided'
+
+    title = first_text('h2', 'header-e')
+    primary_price = first_text('span', 'info-primary-price').replace('\xa0', ' ')
+    area = first_text('span', 'info-area').replace('\xa0', ' ')
+    interest_level = first_text('p', 'par-a')
+
+    basic_info = soup.find_all('div', class_='box__attributes--content')
+    basic_info = [info.get_text(separator=" ").strip() for info in basic_info]
+
+    details_lists = soup.find_all('ul', class_=lambda value: value and value.startswith('list-h'))
+    details = {}
+    for details_list in details_lists:
+        for li in details_list.find_all('li'):
+            strong = li.find('strong')
+            key = strong.text.strip().rstrip(':') if strong else None
+            if key:
+                span = li.find('span')
+                details[key] = span.text.strip() if span else 'Not provided'
+
+    offer_details = {
+        'title': title,
+        'price': primary_price,
+        'area': area,
+        'interest_level': interest_level,
+        'basic_info': basic_info,
+        'details': details
+    }
+    return offer_details
+
+
 def save_to_csv(offer_details: Optional[Dict[str, Union[str, List[str], Dict[str, str]]]]) -> None:
     """Save offer details to CSV file.
+    Kept for compatibility, crawls write through an `OfferSink` which buffers offers instead of appending them one by one.
     :param offer_details: Dictionary of offer details
     """
     if offer_details:
-        df = pd.DataFrame([offer_details])
-        df.to_csv('offer_details.csv', index=False, mode='a', header=False)
+        with CsvSink('offer_details.csv', batch_size=1) as sink:
+            sink.write(offer_details)
 
 
-def open_website(url: str, max_retries: int = 5, delay: int = 5) -> Optional[str]:
+def open_website(url: str, max_retries: int = 5, delay: int = 5, archive: Optional[PageArchive] = None, kind: str = 'page',
+                 limiter: Optional[AdaptiveRateLimiter] = None, timeout: float = 30,
+                 metrics: Optional[ScrapeMetrics] = None) -> Optional[bytes]:
     """Opens the website and returns its content.
+    If an archive is given, an already archived page is revalidated with ETag/If-Modified-Since
+    and a fresh response is stored in the archive.
+    If a rate limiter is given, every attempt waits for it and reports its outcome to it,
+    and the limiter's backoff (or Retry-After) replaces the fixed delay between retries.
+    If metrics are given, the latency, status and size of every attempt and the number of attempts are recorded.
     :param url: URL of the website
     :param max_retries: Maximum number of retries
     :param delay: Delay between retries
+    :param archive: Archive of fetched pages
+    :param kind: Kind of the page stored in the archive ('search' or 'offer')
+    :param limiter: Shared rate limiter
+    :param timeout: Timeout of a single request in seconds
+    :param metrics: Crawl metrics
     :return: HTML content of the website
     """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-    }
+    headers = dict(HEADERS)
+    if archive is not None:
+        headers.update(archive.conditional_headers(url))
 
+    attempts = 0
     for attempt in range(max_retries):
+        if limiter is not None:
+            limiter.acquire(url)
+        attempts += 1
+        start = time.perf_counter()
         try:
-            response = requests.get(url, headers=headers)
-            if response.status_code == 200:
-                print("Successfully opened the website.")
-                return response.content
-            elif response.status_code == 503:
-                print(f"Status code 503. Attempt {attempt+1} of {max_retries}.")
-                time.sleep(delay)
-            else:
-                print(f"Error: {response.status_code}. Attempt {attempt+1} of {max_retries}.")
-                break
+            response = requests.get(url, headers=headers, timeout=timeout)
         except requests.exceptions.RequestException as e:
             print(f"RequestException: {e}. Attempt {attempt+1} of {max_retries}.")
-            time.sleep(delay)
+            if metrics is not None:
+                metrics.record_response(kind, time.perf_counter() - start, None)
+            if limiter is not None:
+                limiter.release(url)
+            else:
+                time.sleep(delay)
+            continue
+        if metrics is not None:
+            metrics.record_response(kind, time.perf_counter() - start, response.status_code, len(response.content))
+        if limiter is not None:
+            limiter.release(url, response.status_code, response.headers.get('Retry-After'))
+
+        if response.status_code == 200:
+            print("Successfully opened the website.")
+            if archive is not None:
+                archive.store(url, response.content, kind, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            if metrics is not None:
+                metrics.record_request(kind, attempts, True)
+            return response.content
+        elif response.status_code == 304 and archive is not None:
+            print("Website not modified, using the archived copy.")
+            archive.mark_revalidated(url)
+            if metrics is not None:
+                metrics.record_request(kind, attempts, True)
+            return archive.latest(url)
+        elif response.status_code == 503:
+            print(f"Status code 503. Attempt {attempt+1} of {max_retries}.")
+            if limiter is None:
+                time.sleep(delay)
+        else:
+            print(f"Error: {response.status_code}. Attempt {attempt+1} of {max_retries}.")
+            break
 
     print("Unable to open the website after max retries attempts.")
+    if metrics is not None:
+        metrics.record_request(kind, attempts, False)
     return None
 
 
-if __name__ == '__main__':
-    universal_url = "https://wroclaw.nieruchomosci-online.pl/szukaj.html?3,mieszkanie,sprzedaz,,Wrocław:17876&p={}&q=%7B%7D"
+def reparse_archive(archive: PageArchive, sink: OfferSink) -> None:
+    """Rebuild the offer dataset from archived offer pages without any network traffic.
+    Offers are written sorted by offer URL.
+    :param archive: Archive of fetched pages
+    :param sink: Output sink for the offers
+    """
+    for url, content in archive.iter_latest(kind='offer'):
+        sink.write(parse_offer_details(content), url=url)
+
+
+def crawl(list_of_pages: List[str], sink: OfferSink, archive: Optional[PageArchive] = None, state: Optional[CrawlState] = None,
+          limiter: Optional[AdaptiveRateLimiter] = None, metrics: Optional[ScrapeMetrics] = None) -> None:
+    """Crawl the search pages and save the details of every offer.
+    With a crawl state the crawl is resumable and incremental: processed pages and offers are checkpointed,
+    and offers whose search tile and content didn't change since the last run are neither fetched nor saved again.
+    Offer checkpoints are committed whenever the sink flushes, so buffered offers are never lost on a crash.
+    :param list_of_pages: List of search page URLs
+    :param sink: Output sink for the offers
+    :param archive: Archive of fetched pages
+    :param state: Persistent crawl state
+    :param limiter: Shared rate limiter
+    :param metrics: Crawl metrics, dumped to `metrics.path` when the crawl ends (also on failure)
+    """
+    try:
+        _crawl(list_of_pages, sink, archive, state, limiter, metrics)
+    finally:
+        if metrics is not None:
+            metrics.dump()
+
 
-    list_of_pages = [universal_url.format(i) for i in range(1, 181)]
-    all_offer_links = []
+def _crawl(list_of_pages: List[str], sink: OfferSink, archive: Optional[PageArchive], state: Optional[CrawlState],
+           limiter: Optional[AdaptiveRateLimiter], metrics: Optional[ScrapeMetrics]) -> None:
+    if state is None:
+        all_offer_links = []
+        for url in list_of_pages:
+            web_site_content = open_website(url, archive=archive, kind='search', limiter=limiter, metrics=metrics)
+            if web_site_content is not None:
+                offer_links = timed_parse(metrics, 'search', get_offers, web_site_content)
+                all_offer_links.extend(offer_links)
 
+        for offer_link in all_offer_links:
+            offer_details = scrape_offer_details(offer_link, archive=archive, limiter=limiter, metrics=metrics)
+            sink.write(offer_details, url=offer_link)
+        sink.flush()
+        return
+
+    state.start_run()
+    sink.on_flush.append(state.commit)
     for url in list_of_pages:
-        web_site_content = open_website(url)
+        if state.page_done(url):
+            continue
+        web_site_content = open_website(url, archive=archive, kind='search', limiter=limiter, metrics=metrics)
         if web_site_content is not None:
-            offer_links = get_offers(web_site_content)
-            all_offer_links.extend(offer_links)
+            state.mark_page_done(url, timed_parse(metrics, 'search', get_offer_tiles, web_site_content))
+
+    for offer_link, tile_hash in state.pending_offers():
+        offer_details = scrape_offer_details(offer_link, archive=archive, limiter=limiter, metrics=metrics)
+        offer_hash = content_hash(offer_details) if offer_details else None
+        if offer_details and state.is_changed(offer_link, offer_hash):
+            sink.write(offer_details, url=offer_link)
+        state.mark_offer_done(offer_link, tile_hash, offer_hash)
+    sink.flush()
+    sink.on_flush.remove(state.commit)
+    state.finish_run()
+
+
+if __name__ == '__main__':
+    archive = PageArchive('archive')
+    state = CrawlState('crawl_state.sqlite')
+    limiter = AdaptiveRateLimiter()
+    metrics = ScrapeMetrics('crawl_metrics.json')
+    reparse = False
 
-    for offer_link in all_offer_links:
-        offer_details = scrape_offer_details(offer_link)
-        if offer_details:
-            save_to_csv(offer_details)
+    with open_sink('listings.sqlite', batch_size=500) as sink:
+        if reparse:
+            reparse_archive(archive, sink)
+        else:
+            crawl(search_pages(), sink, archive=archive, state=state, limiter=limiter, metrics=metrics)
@@ -0,0 +1,105 @@
+import operator
+from datetime import date
+import numpy as np
+import pandas as pd
+
+# Markers of missing values in the scraped offers
+MISSING_VALUES = ['-', 'N/A', 'N/A ']
+
+# Phrases of the scraped states of the apartment and the state `data_clearing.format_data` maps them to, the first
+# phrase contained in a scraped state wins; offers of other cities with other wording need their phrases added here
+STATE_MAPPING = {
+    'wysoki standard': 'bardzo dobry',
+    'nowe wykończone': 'bardzo dobry',
+    'do odświeżenia': 'do remontu',
+    'bardzo dobry': 'bardzo dobry',
+    'dobry': 'dobry',
+    'do remontu': 'do remontu',
+    'do wykończenia': 'do wykończenia',
+    'deweloperski': 'deweloperski',
+}
+# States of the apartment after the mapping, scraped states matching no phrase are quarantined
+STATES = list(dict.fromkeys(STATE_MAPPING.values()))
+
+# Rules of the formatted columns, every column is also required to be present in the scraped offer:
+# - `numeric`: the text has to be parsed as a number, `integer`: as a whole number
+# - `min` and `max`: inclusive range of the value
+# - `allowed`: list of allowed values
+COLUMN_RULES = {
+    'location': {},
+    'price': {'numeric': True, 'min': 1_000, 'max': 1_000_000_000},
+    'area': {'numeric': True, 'min': 5, 'max': 100_000},
+    'rooms': {'integer': True, 'min': 1, 'max': 50},
+    'floor': {'integer': True, 'min': 0, 'max': 120},
+    'total_floors': {'integer': True, 'min': 0, 'max': 120},
+    'year': {'integer': True, 'min': 1200, 'max': date.today().year + 10},
+    'parking': {'allowed': [0, 1]},
+    'state': {'allowed': STATES},
+    'furnished': {'allowed': [0, 1]},
+    'market': {'allowed': ['primary', 'secondary']},
+}
+
+# Rules relating two columns: reason code -> (column, comparison which has to hold, other column)
+ROW_RULES = {
+    'floor:above_total_floors': ('floor', operator.le, 'total_floors'),
+}
+
+
+def standardize_state(state: str) -> str:
+    """Map a scraped state of the apartment to its state in `STATE_MAPPING`.
+    :param state: Scraped state, e.g. 'Wysoki standard'
+    :return: Standardized state, e.g. 'bardzo dobry', or the scraped state if no phrase matches
+    """
+    lowered = state.lower()
+    return next((mapped for phrase, mapped in STATE_MAPPING.items() if phrase in lowered), state)
+
+
+def missing_values(data: pd.DataFrame) -> pd.DataFrame:
+    """Find the missing values of the scraped offers: NaN or one of the `MISSING_VALUES` markers.
+    :param data: Output of `data_clearing.extract_information`
+    :return: Boolean DataFrame, True where the value is missing
+    """
+    missing = data.isna()
+    text_columns = data.select_dtypes(exclude='number').columns
+    missing[text_columns] |= data[text_columns].isin(MISSING_VALUES)
+    return missing
+
+
+def check(data: pd.DataFrame, missing: pd.DataFrame) -> pd.DataFrame:
+    """Evaluate all rules on the whole frame, every rule is a single vectorized comparison of a column.
+    Values which couldn't be converted are expected as NaN in `data`.
+    :param data: Formatted offers
+    :param missing: Missing values of the scraped offers (see `missing_values`) with the same index
+    :return: Boolean DataFrame with a column per reason code ('<column>:<rule>'), True where the rule fails
+    """
+    failures = {}
+    for column, rule in COLUMN_RULES.items():
+        values = data[column]
+        present = ~missing[column]
+        failures[f'{column}:missing'] = missing[column]
+        if rule.get('numeric') or rule.get('integer'):
+            failures[f'{column}:not_numeric'] = present & values.isna()
+        if rule.get('integer'):
+            failures[f'{column}:not_integer'] = values.notna() & (values % 1 != 0)
+        if 'min' in rule:
+            failures[f'{column}:out_of_range'] = (values < rule['min']) | (values > rule['max'])
+        if 'allowed' in rule:
+            failures[f'{column}:unknown_category'] = present & values.notna() & ~values.isin(rule['allowed'])
+    for code, (column, holds, other) in ROW_RULES.items():
+        failures[code] = data[column].notna() & data[other].notna() & ~holds(data[column], data[other])
+    return pd.DataFrame(failures, index=data.index)
+
+
+def reason_codes(failures: pd.DataFrame) -> pd.Series:
+    """Join the reason codes of every failing row.
+    :param failures: Output of `check`
+    :return: Reason codes separated by ';', indexed like the failing rows
+    """
+    failed = failures[failures.any(axis=1)]
+    if len(failures.columns) > 62:
+        return failed.dot(failed.columns + ';').str.rstrip(';')
+    # Every combination of failing rules is joined once, rows are mapped to it by a bit pattern
+    bits = 1 << np.arange(len(failures.columns), dtype=np.int64)
+    patterns, inverse = np.unique(failed.to_numpy() @ bits, return_inverse=True)
+    codes = [';'.join(failures.columns[(pattern & bits) != 0]) for pattern in patterns]
+    return pd.Series(np.array(codes, dtype=object)[inverse], index=failed.index, dtype=str)
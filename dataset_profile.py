@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+PROFILE_CACHE_DIR = '.profile_cache'
+QUANTILES = [0.25, 0.5, 0.75]
+# Columns with at most this many distinct values keep all their value counts in the report
+MAX_VALUES = 100
+
+
+def _python(value):
+    """Convert a numpy scalar to the Python type, so the report can be saved as JSON."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _quantiles(values: np.ndarray, counts: np.ndarray, quantiles: List[float]) -> List[float]:
+    """Compute quantiles (linear interpolation, as `pd.Series.quantile`) from sorted distinct values and their counts."""
+    cumulative = np.cumsum(counts)
+    positions = np.asarray(quantiles) * (cumulative[-1] - 1)
+    lower, upper = np.floor(positions), np.ceil(positions)
+    # The k-th smallest value is the first distinct value whose cumulative count exceeds k
+    low = values[np.searchsorted(cumulative, lower, side='right')].astype(float)
+    high = values[np.searchsorted(cumulative, upper, side='right')].astype(float)
+    return (low + (high - low) * (positions - lower)).tolist()
+
+
+def profile_column(column: pd.Series, quantiles: List[float] = QUANTILES, max_values: int = MAX_VALUES) -> Dict:
+    """Profile a column with a single pass over it: all statistics are computed from its value counts.
+    :param column: Column to profile
+    :param quantiles: Quantiles of numeric columns
+    :param max_values: Maximum number of distinct values whose counts are kept
+    :return: Dictionary with the number of values, nulls, null rate, distinct values, value counts (most frequent
+        first) and, for numeric columns, minimum, maximum and quantiles
+    """
+    counts = column.value_counts(dropna=False, sort=False)
+    counts = counts[counts > 0]
+    nulls = int(counts[counts.index.isna()].sum())
+    counts = counts[counts.index.notna()]
+    report = {'count': int(counts.sum()), 'nulls': nulls, 'null_rate': nulls / len(column) if len(column) else 0.0,
+              'distinct': len(counts)}
+    if pd.api.types.is_numeric_dtype(column.dtype) and len(counts):
+        counts = counts.sort_index()
+        values = counts.index.to_numpy()
+        report.update({'min': _python(values[0]), 'max': _python(values[-1]),
+                       'quantiles': dict(zip(map(str, quantiles), _quantiles(values, counts.to_numpy(), quantiles)))})
+    if len(counts) <= max_values:
+        report['values'] = [[_python(value), int(count)] for value, count in counts.sort_values(ascending=False, kind='stable').items()]
+    return report
+
+
+def profile(data: pd.DataFrame, columns: Optional[List[str]] = None, quantiles: List[float] = QUANTILES) -> Dict:
+    """Profile the columns of a dataset (see `profile_column`).
+    :param data: Dataset
+    :param columns: Columns to profile, all by default
+    :param quantiles: Quantiles of numeric columns
+    :return: Dictionary with the number of rows and the profile of every column
+    """
+    columns = columns or list(data.columns)
+    return {'rows': len(data), 'columns': {column: profile_column(data[column], quantiles) for column in columns}}
+
+
+def cached_profile(data: pd.DataFrame, version: str, columns: Optional[List[str]] = None,
+                   quantiles: List[float] = QUANTILES, cache_dir: str = PROFILE_CACHE_DIR) -> Dict:
+    """Return the profile of a dataset, computed once per version of the dataset.
+    :param data: Dataset
+    :param version: Identifier of the dataset content, e.g. the hash of the dataset file and the applied filters
+    :param columns: Columns to profile, all by default
+    :param quantiles: Quantiles of numeric columns
+    :param cache_dir: Directory of the saved reports
+    :return: Profile of the dataset
+    """
+    columns = columns or list(data.columns)
+    key = hashlib.sha256(json.dumps({'version': version, 'columns': columns, 'quantiles': quantiles}).encode('utf-8')).hexdigest()
+    path = os.path.join(cache_dir, f'{key}.json')
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    report = profile(data, columns, quantiles)
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+    return report
+
+
+def print_profile(report: Dict) -> None:
+    """Print the profile of every column, with the counts of its values like `data_analysis.show_unique_values`."""
+    for column, stats in report['columns'].items():
+        print(f"{'-' * 15} {column} {'-' * 15}")
+        print(f"count: {stats['count']}, nulls: {stats['nulls']} ({stats['null_rate']:.2%}), distinct: {stats['distinct']}")
+        if 'min' in stats:
+            quantiles = ', '.join(f'q{q}: {value:g}' for q, value in stats['quantiles'].items())
+            print(f"min: {stats['min']}, max: {stats['max']}, {quantiles}")
+        for value, count in stats.get('values', []):
+            print(value, count)
+        print()
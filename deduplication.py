@@ -0,0 +1,215 @@
+import zlib
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from gazetteer import normalize_name, resolve_districts
+
+# MinHash signature length and the number of LSH bands it is split into, offers sharing all values of a band
+# are candidates; with 8 bands of 4 hashes titles with a Jaccard similarity of 0.6 become candidates with p ~ 0.65
+NUM_HASHES = 32
+BANDS = 8
+# Length of the character shingles of the street or estate of a title
+SHINGLE_SIZE = 3
+# Mersenne prime of the universal hash functions of the MinHash
+_PRIME = (1 << 61) - 1
+
+
+def location_part(title: str) -> str:
+    """Get the most specific place of an offer title: its street or, if it names none, its estate.
+    The city and the voivodeship end every title and are shared by all offers of a city, the estate is shared by
+    all offers of its streets, so neither of them identifies an apartment.
+    :param title: Offer title, e.g. 'Mikołaja, Stare Miasto, Wrocław, dolnośląskie'
+    :return: Street or estate, e.g. 'Mikołaja', empty if the title has neither
+    """
+    parts = [part.strip() for part in title.split(',')]
+    # All voivodeship names end with '-skie'
+    if len(parts) >= 2 and parts[-1].endswith('skie'):
+        parts = parts[:-2]
+    return parts[0] if parts else ''
+
+
+def shingles(title: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """Hash the character shingles of the normalized street or estate of a title (see `location_part` and
+    `gazetteer.normalize_name`).
+    :param title: Offer title, e.g. 'Mikołaja, Stare Miasto, Wrocław, dolnośląskie'
+    :param size: Length of the shingles
+    :return: Array of distinct CRC32 hashes of the shingles
+    """
+    text = normalize_name(location_part(title)).replace(',', '')
+    text = text if len(text) >= size else text.ljust(size)
+    return np.unique(np.array([zlib.crc32(text[i:i + size].encode('utf-8')) for i in range(len(text) - size + 1)], dtype=np.uint64))
+
+
+def minhash_signatures(titles: pd.Series, num_hashes: int = NUM_HASHES, seed: int = 0) -> np.ndarray:
+    """Compute the MinHash signature of every title, every distinct title is shingled once.
+    The shingles of all titles are hashed together by each of the `num_hashes` hash functions and the minimum
+    per title is taken with `np.minimum.reduceat`, so the cost is linear in the total number of shingles.
+    :param titles: Column of titles
+    :param num_hashes: Length of the signatures
+    :param seed: Seed of the hash functions
+    :return: Array of shape (len(titles), num_hashes)
+    """
+    codes, uniques = pd.factorize(titles)
+    hashed = [shingles(title) for title in uniques]
+    offsets = np.cumsum([0] + [len(values) for values in hashed[:-1]])
+    values = np.concatenate(hashed) if hashed else np.empty(0, dtype=np.uint64)
+    random = np.random.default_rng(seed)
+    a = random.integers(1, _PRIME, num_hashes, dtype=np.uint64)
+    b = random.integers(0, _PRIME, num_hashes, dtype=np.uint64)
+    signatures = np.empty((len(uniques), num_hashes), dtype=np.uint64)
+    for k in range(num_hashes):
+        # Products wrap around 2^64, the result is still a valid hash of the shingle
+        if len(values):
+            signatures[:, k] = np.minimum.reduceat((a[k] * values + b[k]) % _PRIME, offsets)
+    return signatures[codes]
+
+
+def candidate_pairs(signatures: np.ndarray, blocks: np.ndarray, bands: int = BANDS,
+                    order: Optional[np.ndarray] = None) -> np.ndarray:
+    """Find pairs of offers sharing a LSH bucket.
+    The bucket of an offer in a band is the hash of its block and the band of its signature.
+    The offers of a bucket are paired with their neighbours in `order` only, so a bucket of n offers gives n - 1 pairs
+    instead of n^2 and the cost stays linear; the other bands give further chances to meet a match.
+    :param signatures: MinHash signatures
+    :param blocks: Integer key per offer which duplicates have to share (e.g. district, market, floors, year and rooms)
+    :param bands: Number of bands
+    :param order: Row positions in the order the offers of a bucket are chained in, e.g. by price, by position if None
+    :return: Array of shape (pairs, 2) of row positions, the first position is the smaller one
+    """
+    order = np.arange(len(signatures)) if order is None else order
+    width = signatures.shape[1] // bands
+    multipliers = np.random.default_rng(1).integers(1, 1 << 62, width + 1, dtype=np.uint64)
+    pairs = []
+    for band in range(bands):
+        keys = blocks.astype(np.uint64) * multipliers[0]
+        for j in range(width):
+            keys = keys + signatures[:, band * width + j] * multipliers[j + 1]
+        chained = order[np.argsort(keys[order], kind='stable')]
+        same = keys[chained[1:]] == keys[chained[:-1]]
+        first, second = chained[:-1][same], chained[1:][same]
+        pairs.append(np.column_stack([np.minimum(first, second), np.maximum(first, second)]))
+    pairs = np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+    if not len(pairs):
+        return np.empty((0, 2), dtype=np.int64)
+    # Pairs found in several bands are kept once
+    pairs = np.sort(pairs[:, 0].astype(np.int64) * len(signatures) + pairs[:, 1])
+    pairs = pairs[np.append(True, pairs[1:] != pairs[:-1])]
+    return np.column_stack([pairs // len(signatures), pairs % len(signatures)])
+
+
+def connected_components(size: int, pairs: np.ndarray) -> np.ndarray:
+    """Label the connected components of a graph by their smallest node (vectorized union-find).
+    Every round hooks the larger root of each edge joining two trees onto the smaller one and compresses the paths
+    to the roots by pointer jumping, so long chains of edges take a few rounds only.
+    :param size: Number of nodes
+    :param pairs: Edges as an array of shape (edges, 2)
+    :return: Label of every node
+    """
+    labels = np.arange(size)
+    while True:
+        while True:
+            roots = labels[labels]
+            if np.array_equal(roots, labels):
+                break
+            labels = roots
+        first, second = labels[pairs[:, 0]], labels[pairs[:, 1]]
+        joining = first != second
+        if not joining.any():
+            return labels
+        pairs = pairs[joining]
+        np.minimum.at(labels, np.maximum(first, second)[joining], np.minimum(first, second)[joining])
+
+
+def duplicate_clusters(data: pd.DataFrame, titles: pd.Series, similarity: float = 0.5, area_tolerance: float = 0.01,
+                       price_tolerance: float = 0.1, city: str = 'wroclaw') -> np.ndarray:
+    """Cluster near-duplicate offers: the same district, market, floor, number of floors, year of construction and
+    rooms, a similar street or estate (see `location_part`), area and price.
+    Candidates come from MinHash/LSH buckets blocked by these columns. Clusters are built around their canonical
+    offer: an offer joins the first cluster whose canonical offer it matches, so small differences of the price or
+    the area don't chain distinct offers into one cluster, and every offer is compared with the canonical offers of
+    its connected component only, which keeps the cost linear for large clusters of reposted offers. Offers without
+    a street or estate in the title are never duplicates.
+    :param data: Formatted offers with `location` (see `gazetteer.offer_location`), `price`, `area`, `rooms`,
+        `floor`, `total_floors`, `year` and `market`
+    :param titles: Titles of the offers (the unformatted `location`), aligned with `data`
+    :param similarity: Minimum estimated Jaccard similarity of the shingles of the street or estate
+    :param area_tolerance: Maximum relative difference of the area (at least 0.5 m²)
+    :param price_tolerance: Maximum relative difference of the price
+    :param city: City of the offers, its gazetteer resolves the districts of the blocks
+    :return: Position of the canonical (first) offer of the cluster of every offer
+    """
+    signatures = minhash_signatures(titles)
+    blocks = pd.DataFrame({'district': resolve_districts(data['location'], city).to_numpy(), 'market': data['market'].to_numpy(),
+                           'floor': data['floor'].to_numpy(), 'total_floors': data['total_floors'].to_numpy(),
+                           'year': data['year'].to_numpy(), 'rooms': data['rooms'].to_numpy()})
+    blocks = blocks.groupby(list(blocks.columns), sort=False, dropna=False).ngroup().to_numpy(dtype=np.int64)
+    codes, uniques = pd.factorize(titles)
+    located = np.array([location_part(title) != '' for title in uniques] + [False])[codes]
+    area, price = data['area'].to_numpy(dtype=float), data['price'].to_numpy(dtype=float)
+
+    def matches(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+        return (
+            (blocks[first] == blocks[second]) & located[first] & located[second]
+            & ((signatures[first] == signatures[second]).mean(axis=-1) >= similarity)
+            & (np.abs(area[first] - area[second]) <= np.maximum(0.5, area_tolerance * np.maximum(area[first], area[second])))
+            & (np.abs(price[first] - price[second]) <= price_tolerance * np.maximum(price[first], price[second]))
+        )
+
+    # Offers of a bucket are chained by price, so reposts at drifting prices are linked to their closest prices
+    pairs = candidate_pairs(signatures, blocks, order=np.argsort(price, kind='stable'))
+    components = connected_components(len(data), pairs[matches(pairs[:, 0], pairs[:, 1])])
+    clusters = components.copy()
+    # Offers of components with more than one offer, by component and position; a component's label is its first offer
+    members = np.flatnonzero(np.bincount(components, minlength=len(data))[components] > 1)
+    members = members[np.argsort(components[members], kind='stable')]
+    if not len(members):
+        return clusters
+    starts = np.flatnonzero(np.diff(components[members], prepend=-1))
+    # Components of offers with the same signature whose price and area ranges are within the tolerances match
+    # their first offer, they are clusters as they are; only the others are split
+    price_low, price_high = np.minimum.reduceat(price[members], starts), np.maximum.reduceat(price[members], starts)
+    area_low, area_high = np.minimum.reduceat(area[members], starts), np.maximum.reduceat(area[members], starts)
+    same_signature = np.logical_and.reduceat((signatures[members] == signatures[components[members]]).all(axis=1), starts)
+    complete = (same_signature & (price_high - price_low <= price_tolerance * price_high)
+                & (area_high - area_low <= np.maximum(0.5, area_tolerance * area_high)))
+    ends = np.append(starts[1:], len(members))
+    for index in np.flatnonzero(~complete):
+        canonical = np.empty(ends[index] - starts[index], dtype=np.int64)
+        found = 0
+        for offer in members[starts[index]:ends[index]]:
+            linked = np.flatnonzero(matches(offer, canonical[:found]))
+            if len(linked):
+                clusters[offer] = canonical[linked[0]]
+            else:
+                clusters[offer] = canonical[found] = offer
+                found += 1
+    return clusters
+
+
+def deduplicate(data: pd.DataFrame, titles: pd.Series, **kwargs) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Keep the first offer of every cluster of near-duplicates (see `duplicate_clusters`).
+    :param data: Formatted offers
+    :param titles: Titles of the offers, aligned with `data`
+    :param kwargs: Thresholds and city of `duplicate_clusters`
+    :return: Offers without duplicates and the offers of clusters with more than one offer, with the index label
+        of the canonical offer in `cluster` and the title in `title`
+    """
+    clusters = duplicate_clusters(data, titles, **kwargs)
+    sizes = np.bincount(clusters, minlength=len(data))[clusters]
+    report = data[sizes > 1].assign(title=titles[sizes > 1].to_numpy(), cluster=data.index[clusters[sizes > 1]],
+                                    canonical=(clusters == np.arange(len(data)))[sizes > 1])
+    return data[clusters == np.arange(len(data))], report.sort_values('cluster', kind='stable')
+
+
+def cluster_statistics(report: pd.DataFrame) -> Dict:
+    """Summarize the duplicate clusters of `deduplicate`.
+    :param report: Offers of clusters with more than one offer
+    :return: Number of clusters, removed duplicates, cluster sizes and relative price spread within the clusters
+    """
+    if report.empty:
+        return {'clusters': 0, 'duplicates': 0, 'max_size': 0, 'mean_size': 0.0, 'median_price_spread': 0.0}
+    groups = report.groupby('cluster')['price']
+    sizes = groups.size()
+    spread = (groups.max() - groups.min()) / groups.min()
+    return {'clusters': len(sizes), 'duplicates': int(sizes.sum() - len(sizes)), 'max_size': int(sizes.max()),
+            'mean_size': round(float(sizes.mean()), 2), 'median_price_spread': round(float(spread.median()), 4)}
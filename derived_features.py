@@ -0,0 +1,44 @@
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# Columns derived from the cleaned offers: name -> (type, columns it is computed from, vectorized function)
+# - `price_per_m2`: price divided by the area
+# - `building_age`: years since the construction at the time the dataset was written (0 for buildings under construction)
+# - `floor_ratio`: floor divided by the number of floors of the building, 0 in buildings with only a ground floor
+# - `top_floor` and `ground_floor`: 1 for offers on the highest and on the ground floor
+DERIVED_FEATURES: Dict[str, Tuple[str, List[str], Callable[[pd.DataFrame], pd.Series]]] = {
+    'price_per_m2': ('float64', ['price', 'area'], lambda data: data['price'] / data['area']),
+    'building_age': ('int16', ['year'], lambda data: (date.today().year - data['year'].astype(np.int16)).clip(lower=0)),
+    'floor_ratio': ('float64', ['floor', 'total_floors'],
+                    lambda data: data['floor'] / data['total_floors'].where(data['total_floors'] > 0, 1)),
+    'top_floor': ('int8', ['floor', 'total_floors'], lambda data: data['floor'] >= data['total_floors']),
+    'ground_floor': ('int8', ['floor'], lambda data: data['floor'] == 0),
+}
+DERIVED_SCHEMA = {name: dtype for name, (dtype, _, _) in DERIVED_FEATURES.items()}
+DERIVED_COLUMNS = list(DERIVED_FEATURES)
+
+
+def source_columns(columns: List[str]) -> List[str]:
+    """Replace the derived columns of a column selection by the columns they are computed from.
+    :param columns: Requested columns, cleaned and derived
+    :return: Cleaned columns to read, without repetitions and in the order of the request
+    """
+    needed = []
+    for column in columns:
+        for source in DERIVED_FEATURES[column][1] if column in DERIVED_FEATURES else [column]:
+            if source not in needed:
+                needed.append(source)
+    return needed
+
+
+def add_derived(data: pd.DataFrame, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Compute the derived columns which are missing in the data, each as a single vectorized operation.
+    :param data: Cleaned offers with the columns the derived columns are computed from
+    :param columns: Derived columns to add, all if None
+    :return: Copy of the data with the derived columns
+    """
+    missing = [column for column in (DERIVED_COLUMNS if columns is None else columns) if column not in data.columns]
+    return data.assign(**{column: DERIVED_FEATURES[column][2](data).astype(DERIVED_FEATURES[column][0])
+                          for column in missing})
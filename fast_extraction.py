@@ -0,0 +1,119 @@
+import hashlib
+import re
+from typing import List, Dict, Union, Tuple
+from lxml import etree, html
+
+# Precompiled XPath expressions matching the BeautifulSoup lookups in `data_scrapping.py`.
+# `contains(concat(' ', normalize-space(@class), ' '), ' x ')` is the XPath form of `class_='x'`.
+_offer_tiles = etree.XPath("//div[starts-with(normalize-space(@class), 'tile tile-tile')]")
+_tile_link = etree.XPath("(.//a[contains(concat(' ', normalize-space(@class), ' '), ' tabCtrl ')])[1]")
+_title = etree.XPath("(//h2[contains(concat(' ', normalize-space(@class), ' '), ' header-e ')])[1]")
+_primary_price = etree.XPath("(//span[contains(concat(' ', normalize-space(@class), ' '), ' info-primary-price ')])[1]")
+_area = etree.XPath("(//span[contains(concat(' ', normalize-space(@class), ' '), ' info-area ')])[1]")
+_interest_level = etree.XPath("(//p[contains(concat(' ', normalize-space(@class), ' '), ' par-a ')])[1]")
+_basic_info = etree.XPath("//div[contains(concat(' ', normalize-space(@class), ' '), ' box__attributes--content ')]")
+_details_items = etree.XPath("//ul[contains(concat(' ', normalize-space(@class)), ' list-h')]//li")
+_first_strong = etree.XPath("(.//strong)[1]")
+_first_span = etree.XPath("(.//span)[1]")
+# Text of scripts and style sheets isn't part of BeautifulSoup's `.text`
+_text_nodes = etree.XPath(".//text()[not(ancestor::script or ancestor::style)]")
+_pagination_links = etree.XPath("//div[contains(concat(' ', normalize-space(@class), ' '), ' pagination ')]//a/@href")
+_page_number = re.compile(r'[?&]p=(\d+)')
+# Byte order mark or `<meta charset>` / `<meta http-equiv="Content-Type">` declaring the encoding of a page,
+# looked up in the first 1024 bytes like browsers do
+_declared_encoding = re.compile(rb'\A(?:\xef\xbb\xbf|\xff\xfe|\xfe\xff)|<meta[^>]+charset', re.IGNORECASE)
+_parser = html.HTMLParser()
+
+
+def parse_html(content: Union[str, bytes]) -> html.HtmlElement:
+    """Parse an HTML page with lxml.
+    Pages in bytes are decoded like BeautifulSoup does: with the encoding they declare, detected by lxml, otherwise
+    as UTF-8 if they are valid UTF-8 and with lxml's default encoding if not.
+    :param content: HTML content of the page
+    :return: Root element of the document
+    """
+    if isinstance(content, bytes) and not _declared_encoding.search(content[:1024]):
+        try:
+            content = content.decode('utf-8')
+        except UnicodeDecodeError:
+            pass
+    try:
+        root = etree.fromstring(content, _parser)
+    except ValueError:
+        # lxml refuses text with an XML encoding declaration, the page is parsed from its UTF-8 bytes instead
+        root = etree.fromstring(content.encode('utf-8'), html.HTMLParser(encoding='utf-8'))
+    return root if root is not None else html.Element('html')
+
+
+def _text(element: html.HtmlElement) -> str:
+    """Equivalent of BeautifulSoup's `.text`."""
+    return ''.join(_text_nodes(element))
+
+
+def _first_text(xpath: etree.XPath, root: html.HtmlElement) -> str:
+    """Stripped text of the first element matched by `xpath` or 'Not provided'."""
+    found = xpath(root)
+    return _text(found[0]).strip() if found else 'Not provided'
+
+
+def get_offers(web_site_content: Union[str, bytes]) -> List[str]:
+    """lxml version of `data_scrapping.get_offers`.
+    :param web_site_content: HTML content of the website
+    :return: List of offer links
+    """
+    offer_links = []
+    for offer in _offer_tiles(parse_html(web_site_content))[:-1]:
+        link = _tile_link(offer)
+        if link:
+            offer_links.append(link[0].attrib['href'])
+    return offer_links
+
+
+def get_offer_tiles(web_site_content: Union[str, bytes]) -> List[Tuple[str, str]]:
+    """lxml version of `data_scrapping.get_offer_tiles`.
+    :param web_site_content: HTML content of the website
+    :return: List of (offer link, tile hash) tuples
+    """
+    tiles = []
+    for offer in _offer_tiles(parse_html(web_site_content))[:-1]:
+        link = _tile_link(offer)
+        if link:
+            tile_text = ' '.join(' '.join(_text_nodes(offer)).split())
+            tiles.append((link[0].attrib['href'], hashlib.sha1(tile_text.encode('utf-8')).hexdigest()))
+    return tiles
+
+
+def parse_offer_details(content: Union[str, bytes]) -> Dict[str, str | List[str] | Dict[str, str]]:
+    """lxml version of `data_scrapping.parse_offer_details`, every field is looked up exactly once.
+    :param content: HTML content of the offer page
+    :return: Dictionary of offer details
+    """
+    root = parse_html(content)
+
+    basic_info = [' '.join(_text_nodes(info)).strip() for info in _basic_info(root)]
+
+    details = {}
+    for li in _details_items(root):
+        strong = _first_strong(li)
+        key = _text(strong[0]).strip().rstrip(':') if strong else None
+        if key:
+            span = _first_span(li)
+            details[key] = _text(span[0]).strip() if span else 'Not provided'
+
+    return {
+        'title': _first_text(_title, root),
+        'price': _first_text(_primary_price, root).replace('\xa0', ' '),
+        'area': _first_text(_area, root).replace('\xa0', ' '),
+        'interest_level': _first_text(_interest_level, root),
+        'basic_info': basic_info,
+        'details': details
+    }
+
+
+def get_page_count(web_site_content: Union[str, bytes]) -> int:
+    """lxml version of `data_scrapping.get_page_count`.
+    :param web_site_content: HTML content of the first search page
+    :return: Number of search result pages
+    """
+    numbers = [int(match.group(1)) for href in _pagination_links(parse_html(web_site_content)) if (match := _page_number.search(href))]
+    return max(numbers, default=1)
@@ -0,0 +1,14 @@
+import hashlib
+import os
+from typing import Optional
+
+
+def file_hash(path: str) -> Optional[str]:
+    """Return the SHA-256 of a file's content or None if the file doesn't exist."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
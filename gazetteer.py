@@ -0,0 +1,146 @@
+import difflib
+import json
+import unicodedata
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+# Districts of Wrocław and the locations (estates, streets) belonging to them
+DISTRICTS = {
+    "Stare Miasto": ["Stare Miasto", "Ołbin", "Wrocław", "Świdnicka", "Więzienna", "Nożownicza", "Włodkowica"],
+    "Krzyki": ["Krzyki", "Partynice", "Wojszyce", "Klecina", "Borek", "Tarnogaj", "Oporów", "Jagodno", "Gaj", "Krzyk", "Księże Małe", "Księże Wielkie", "Poświętne", "Ołtaszyn", "Przedmieście Oławskie", "Rakowiec"],
+    "Fabryczna": ["Fabryczna", "Grabiszyn", "Grabiszynek", "Grabiszyn-Grabiszynek", "Muchobór Wielki", "Nowy Dwór", "Fabryczna", "Gądów Mały", "Gądów-Popowice Południowe", "Muchobór Mały", "Pilczyce", "Żerniki", "Maślice", "Stabłowice", "Zakrzów", "Leśnica", "Kozanów", "Złotniki", "Gajowice", "Strachowice"],
+    "Psie Pole": ["Psie Pole", "Swojczyce", "Różanka", "Kowale", "Sołtysowice", "Osobowice", "Karłowice", "Kleczków", "Lipa Piotrowska", "Popowice", "Kępa Mieszczańska", "Brochów", "Bieńkowice", "Szczepin", "Polanowice", "Wojnów", "Strachocin", "Widawa"],
+    "Śródmieście": ["Nadodrze", "Śródmieście", "Plac Grunwaldzki", "Huby", "Przedmieście Świdnickie", "Zaporoska", "Sępolno", "Biskupin", "Dąbie", "Zalesie", "Szczytniki"]
+}
+UNKNOWN_DISTRICT = "Inne"
+
+# Maximum number of typos (edits) of a name matched by the fuzzy fallback, names of `LONG_NAME` or more characters
+# may have one more
+MAX_TYPOS = 1
+LONG_NAME = 10
+
+# Letters without a Unicode decomposition, the other Polish diacritics are removed by NFKD
+_LETTERS = str.maketrans({'ł': 'l', 'Ł': 'L', 'ß': 'ss'})
+# Abbreviations at the start of street and estate names and their replacements
+_PREFIXES = {'ul. ': '', 'ul ': '', 'al. ': '', 'al ': '', 'os. ': '', 'os ': '', 'osiedle ': '', 'pl. ': 'plac ', 'pl ': 'plac '}
+
+
+def normalize_name(name: str) -> str:
+    """Normalize a place name for lookups: case, Polish diacritics, hyphens, whitespace and street prefixes.
+    :param name: Name of a district, estate or street, e.g. 'ul. Gądów-Popowice  Południowe'
+    :return: Normalized name, e.g. 'gadow popowice poludniowe'
+    """
+    name = unicodedata.normalize('NFKD', name.translate(_LETTERS).casefold())
+    name = ''.join(char for char in name if not unicodedata.combining(char))
+    name = ' '.join(name.replace('-', ' ').split())
+    for prefix, replacement in _PREFIXES.items():
+        if name.startswith(prefix):
+            return replacement + name[len(prefix):].strip()
+    return name
+
+
+def typos(first: str, second: str) -> int:
+    """Count the typos between two names: insertions, deletions, substitutions and swaps of adjacent letters
+    (optimal string alignment distance)."""
+    previous, current = None, list(range(len(second) + 1))
+    for i in range(1, len(first) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(second)
+        for j in range(1, len(second) + 1):
+            cost = first[i - 1] != second[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and first[i - 1] == second[j - 2] and first[i - 2] == second[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
+
+
+def offer_location(title: str) -> str:
+    """Get the location from the offer title.
+    If the title is split by a comma and the length is 4, take the second element, otherwise the first one.
+    :param title: Offer title, e.g. 'Wrocław, Krzyki, Gaj, ul. Świeradowska'
+    :return: Location
+    """
+    parts = title.split(',')
+    return parts[1].strip() if len(parts) == 4 else parts[0].strip()
+
+
+class Gazetteer:
+    """Place name index of a single city.
+    Every district and location is stored in an inverted hash index under its normalized name, so a lookup
+    costs one normalization and one dictionary access regardless of the size of the gazetteer.
+    Names missing from the index fall back to the closest indexed name (difflib ratio >= `cutoff`) which differs by
+    a typo only (see `typos`) and has the same ending: Polish names inflect at their end, so a different ending is
+    another place, e.g. the street 'Różana' and the estate 'Różanka'. Fuzzy results are memoized per distinct input.
+    """
+
+    def __init__(self, districts: Dict[str, List[str]], cutoff: float = 0.85, default: str = UNKNOWN_DISTRICT):
+        self.cutoff = cutoff
+        self.default = default
+        self.index: Dict[str, str] = {}
+        for district, locations in districts.items():
+            for name in [district] + locations:
+                self.index.setdefault(normalize_name(name), district)
+        self._names = sorted(self.index)
+        self._resolved: Dict[str, str] = {}
+
+    @classmethod
+    def from_json(cls, path: str, **kwargs) -> 'Gazetteer':
+        """Load a gazetteer from a JSON file mapping district names to lists of locations."""
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f), **kwargs)
+
+    def resolve(self, location: str) -> str:
+        """Find the district of a location.
+        :param location: Location of the offer
+        :return: District name or the default ('Inne') if no indexed name is close enough
+        """
+        if location in self._resolved:
+            return self._resolved[location]
+        name = normalize_name(location)
+        district = self.index.get(name)
+        if district is None:
+            matches = [match for match in difflib.get_close_matches(name, self._names, n=3, cutoff=self.cutoff)
+                       if match[-2:] == name[-2:] and typos(name, match) <= MAX_TYPOS + (len(name) >= LONG_NAME)]
+            district = self.index[matches[0]] if matches else self.default
+        self._resolved[location] = district
+        return district
+
+    def resolve_column(self, locations: pd.Series) -> pd.Series:
+        """Resolve a whole column, every distinct location is resolved once and mapped back via the category codes.
+        :param locations: Column of locations
+        :return: Column of districts (missing locations stay missing)
+        """
+        codes, uniques = pd.factorize(locations)
+        districts = np.array([self.resolve(location) for location in uniques] + [None], dtype=object)
+        return pd.Series(districts[codes], index=locations.index, name=locations.name, dtype=locations.dtype)
+
+
+# Gazetteers by city name (the `city` of `cities.json`)
+GAZETTEERS: Dict[str, Gazetteer] = {'wroclaw': Gazetteer(DISTRICTS)}
+
+
+def register_gazetteer(city: str, gazetteer: Gazetteer) -> None:
+    """Add the gazetteer of another city."""
+    GAZETTEERS[city] = gazetteer
+
+
+def find_district(location: str, city: str = 'wroclaw') -> str:
+    """Find the district based on the location.
+    :param location: Location of the offer
+    :param city: City of the offer
+    :return: District name or 'Inne' if the location or the city is unknown
+    """
+    gazetteer: Optional[Gazetteer] = GAZETTEERS.get(city)
+    return gazetteer.resolve(location) if gazetteer is not None else UNKNOWN_DISTRICT
+
+
+def resolve_districts(locations: pd.Series, city: str = 'wroclaw') -> pd.Series:
+    """Find the districts of a whole column of locations.
+    :param locations: Column of locations
+    :param city: City of the offers
+    :return: Column of districts
+    """
+    gazetteer = GAZETTEERS.get(city)
+    if gazetteer is None:
+        return pd.Series(UNKNOWN_DISTRICT, index=locations.index, name=locations.name, dtype=locations.dtype)
+    return gazetteer.resolve_column(locations)
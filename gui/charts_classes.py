@@ -3,7 +3,7 @@ from tkinter import ttk
 from typing import Callable
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from gui.graphs import price_vs_area, avg_price_per_district, price_distribution, price_vs_rooms, price_vs_year, price_vs_floor
+from gui.graphs import price_vs_area, avg_price_per_district, avg_price_per_m2_per_district, price_distribution, price_vs_rooms, price_vs_year, price_vs_floor
 
 class ChartsWindowMenu(ttk.Frame):
     def __init__(self, master):
@@ -23,13 +23,14 @@ class ChartsWindowMenu(ttk.Frame):
         buttons_frame = ttk.Frame(self)
         buttons_frame.grid(column=0, row=1, pady=10)
 
-        # Create buttons for different charts in 2 columns, 3 rows
+        # Create buttons for different charts in 2 columns, 4 rows
         self.create_button(buttons_frame, "Cena vs Powierzchnia", self.open_chart_1, 0, 0)
         self.create_button(buttons_frame, "Przykładowe przewidywania", self.open_chart_2, 0, 1)
         self.create_button(buttons_frame, "Rozkład cen", self.open_chart_3, 1, 0)
         self.create_button(buttons_frame, "Cena vs Liczba Pokoi", self.open_chart_4, 1, 1)
         self.create_button(buttons_frame, "Cena vs Rok Budowy", self.open_chart_5, 2, 0)
         self.create_button(buttons_frame, "Cena vs Piętro", self.open_chart_6, 2, 1)
+        self.create_button(buttons_frame, "Cena za m² w Dzielnicy", self.open_chart_7, 3, 0)
 
         # Return button in top left corner
         back_button = ttk.Button(self, text="Powrót do Menu", command=self.go_back)
@@ -64,6 +65,9 @@ class ChartsWindowMenu(ttk.Frame):
     def open_chart_6(self) -> None:
         self.open_chart_window("Cena vs Piętro", price_vs_floor)
 
+    def open_chart_7(self) -> None:
+        self.open_chart_window("Cena za m² w Dzielnicy", avg_price_per_m2_per_district)
+
     def open_chart_window(self, chart_title: str, chart_function: Callable) -> None:
         """Open a new window to display the selected chart.
         :param chart_title: Title of the chart window
@@ -1,24 +1,31 @@
+import json
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-from prediction_models import remove_outliers_wider
+from data_clearing import load_cleaned_data
+from outlier_filter import load_or_fit
+from cleaned_dataset import dataset_path
+from aggregation_cube import CUBE_CACHE_DIR, cached_cube
+from file_hashing import file_hash
 import os
 
 # Get the directory of the current file
 current_dir = os.path.dirname(__file__)
 # Go up two levels to reach the project root directory
 project_root = os.path.abspath(os.path.join(current_dir, '..'))
-# Construct the path to the data_cleaned_formated.csv file
-data_path = os.path.join(project_root, 'data_cleaned_formated.csv')
-data = pd.read_csv(data_path)
+# Construct the path to the cleaned dataset
+data_path = dataset_path(project_root)
+# The charts don't use 'state', the numeric columns take part in the outlier removal
+cleaned_columns = ['location', 'price', 'area', 'rooms', 'floor', 'total_floors', 'year', 'parking', 'furnished', 'market']
+data = load_cleaned_data(data_path, columns=cleaned_columns + ['price_per_m2'])
 
-data = remove_outliers_wider(data)
-data = data[(data['price'] <= 1250000)]
-data = data[(data['price'] >= 100000)]
-data = data[(data['area'] <= 80)]
-data = data[(data['floor'] <= 29)]
-data = data[(data['rooms'] <= 7)]
-data = data[(data['year'] >= 1925)]
+# Remove outliers with the bounds fitted by the training
+outlier_filter = load_or_fit(data[cleaned_columns], os.path.join(project_root, 'others', 'outlier_filter.pkl'))
+data = data[outlier_filter.mask(data)]
+
+# Statistics by district, rooms, decade and market, built once per version of the dataset and outlier bounds
+cube = cached_cube(data, f"{file_hash(data_path)}:{json.dumps(outlier_filter.bounds, sort_keys=True)}",
+                   cache_dir=os.path.join(project_root, CUBE_CACHE_DIR))
 
 def price_vs_area() -> plt.Figure:
     """Create a scatter plot of price vs area."""
@@ -33,7 +40,7 @@ def price_vs_area() -> plt.Figure:
 def avg_price_per_district() -> plt.Figure:
     """Create a bar plot of average price per district."""
     fig, ax = plt.subplots(figsize=(8, 4))
-    avg_price_per_district = data.groupby('location')['price'].mean().sort_values()
+    avg_price_per_district = cube.query(['location'], measures=['price'], quantiles=[])['price_mean'].sort_values()
     avg_price_per_district.plot(kind='bar', ax=ax)
     ax.set_title('Średnia Cena w Dzielnicy')
     ax.set_xlabel('Dzielnica')
@@ -41,6 +48,17 @@ def avg_price_per_district() -> plt.Figure:
     ax.grid(True)
     return fig
 
+def avg_price_per_m2_per_district() -> plt.Figure:
+    """Create a bar plot of average price per m² per district."""
+    fig, ax = plt.subplots(figsize=(8, 4))
+    avg_price_per_m2 = cube.query(['location'], measures=['price_per_m2'], quantiles=[])['price_per_m2_mean'].sort_values()
+    avg_price_per_m2.plot(kind='bar', ax=ax)
+    ax.set_title('Średnia Cena za m² w Dzielnicy')
+    ax.set_xlabel('Dzielnica')
+    ax.set_ylabel('Średnia Cena za m² (PLN)')
+    ax.grid(True)
+    return fig
+
 def price_distribution() -> plt.Figure:
     """Create a histogram of price distribution."""
     fig, ax = plt.subplots(figsize=(8, 4))
@@ -1,8 +1,11 @@
+import os
 import tkinter as tk
 from tkinter import ttk, messagebox
 from typing import Dict, List, Tuple
 from shapely.geometry import Polygon, Point
 from prediction_models import input_pred
+from outlier_filter import FILTER_PATH, OutlierFilter
+from data_validation import STATES
 from gui.map import start_pyqt, show_saved_location
 from gui.districts import districts
 
@@ -51,7 +54,7 @@ class PredictionWindow(ttk.Frame):
             "Parking": ttk.Checkbutton(form_frame, text="Tak"),
             "Rynek": ttk.Combobox(form_frame, values=["pierwotny", "wtórny"]),
             "Umeblowany": ttk.Checkbutton(form_frame, text="Tak"),
-            "Stan": ttk.Combobox(form_frame, values=["bardzo dobry", "dobry", "deweloperski", "do remontu", "do wykończenia"])
+            "Stan": ttk.Combobox(form_frame, values=STATES)
         }
 
         for i, (text, widget) in enumerate(self.widgets.items()):
@@ -97,6 +100,13 @@ class PredictionWindow(ttk.Frame):
         if not total_floors.isdigit() or int(total_floors) <= 0 or int(total_floors) > 50:
             errors.append("Liczba pięter musi być liczbą większą od 0 i mniejszą od 50.")
 
+        # Validate against the range of the training data (outlier filter fitted by the training)
+        if not errors and os.path.exists(FILTER_PATH):
+            labels = {'area': "Powierzchnia", 'rooms': "Liczba pokoi", 'year': "Rok budowy", 'floor': "Piętro", 'total_floors': "Liczba pięter"}
+            values = {column: int(self.widgets[label].get()) for column, label in labels.items()}
+            for column, lower, upper in OutlierFilter.load().violations(values):
+                errors.append(f"{labels[column]} poza zakresem danych treningowych ({lower:g} - {upper:g}).")
+
         return errors
 
     def open_predictions_results(self, data: Dict[str, str]) -> None:
@@ -1,7 +1,9 @@
 # read data from csv change all polish letters to english and make all strings title case
+# run from the project root: python -m gui.refactor_data
 import pandas as pd
+from data_clearing import load_cleaned_data
 
-df = pd.read_csv('data_cleaned_formated.csv', encoding='utf-8')
+df = load_cleaned_data()
 
 dictionary = {
     'ą': 'a',
@@ -0,0 +1,210 @@
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+import pandas as pd
+from crawl_state import content_hash
+from gazetteer import offer_location, find_district
+
+LISTINGS_PATH = 'listings.sqlite'
+# Columns of a scraped offer record (see `offer_sink.OfferSink`)
+RECORD_COLUMNS = ['url', 'scraped_at', 'title', 'price', 'area', 'interest_level', 'basic_info', 'details']
+
+
+def parse_price(price: str) -> Optional[float]:
+    """Parse a scraped price like '650 000 zł' into a number.
+    :param price: Price text of the offer
+    :return: Price in PLN or None if the offer has no numeric price
+    """
+    value = re.sub(r'\s|zł', '', price or '').replace(',', '.')
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class ListingStore:
+    """Embedded listing database in SQLite.
+    - `listings` keeps the latest version of every scraped offer keyed by its URL. Offers are upserted,
+      `first_seen` is kept, `scraped_at` is the last time the offer was written and `updated_at` the last time
+      its content changed. The numeric price and the district, resolved with the gazetteer of the offer's city, are
+      derived on write and indexed with the scrape date.
+    - `cleaned_listings` holds the output of the cleaning stage for the training and analysis loaders.
+    """
+
+    def __init__(self, path: str = LISTINGS_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        # Stores written before offers had a city hold Wrocław offers only
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(listings)')]
+        if columns and 'city' not in columns:
+            with self.connection:
+                self.connection.execute('ALTER TABLE listings ADD COLUMN city TEXT')
+                self.connection.execute("UPDATE listings SET city = 'wroclaw'")
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS listings (
+                url TEXT PRIMARY KEY,
+                title TEXT,
+                price TEXT,
+                area TEXT,
+                interest_level TEXT,
+                basic_info TEXT,
+                details TEXT,
+                price_value REAL,
+                district TEXT,
+                city TEXT,
+                content_hash TEXT NOT NULL,
+                first_seen TEXT NOT NULL,
+                scraped_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS listings_district ON listings (district);
+            CREATE INDEX IF NOT EXISTS listings_city ON listings (city);
+            CREATE INDEX IF NOT EXISTS listings_price ON listings (price_value);
+            CREATE INDEX IF NOT EXISTS listings_scraped_at ON listings (scraped_at);
+            CREATE INDEX IF NOT EXISTS listings_updated_at ON listings (updated_at);
+        ''')
+
+    def upsert(self, records: List[Dict], city: str = 'wroclaw') -> None:
+        """Insert new offers and update known ones in a single transaction.
+        :param records: Offer records with `url` and `scraped_at` (see `offer_sink.OfferSink.write`)
+        :param city: City of the offers (the `city` of `cities.json`), its gazetteer resolves the districts
+        """
+        rows = []
+        for record in records:
+            if not record.get('url'):
+                raise ValueError("Listings are keyed by the offer URL, a record without URL can't be stored")
+            offer_details = {key: record[key] for key in RECORD_COLUMNS[2:]}
+            scraped_at = record.get('scraped_at') or datetime.now(timezone.utc).isoformat(timespec='seconds')
+            rows.append((record['url'], record['title'], record['price'], record['area'], record['interest_level'],
+                         json.dumps(record['basic_info'], ensure_ascii=False), json.dumps(record['details'], ensure_ascii=False),
+                         parse_price(record['price']), find_district(offer_location(record['title']), city), city,
+                         content_hash(offer_details), scraped_at, scraped_at, scraped_at))
+        with self.connection:
+            self.connection.executemany('''
+                INSERT INTO listings (url, title, price, area, interest_level, basic_info, details, price_value, district,
+                                      city, content_hash, first_seen, scraped_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET
+                    updated_at = CASE WHEN content_hash = excluded.content_hash THEN updated_at ELSE excluded.updated_at END,
+                    title = excluded.title, price = excluded.price, area = excluded.area, interest_level = excluded.interest_level,
+                    basic_info = excluded.basic_info, details = excluded.details, price_value = excluded.price_value,
+                    district = excluded.district, city = excluded.city, content_hash = excluded.content_hash, scraped_at = excluded.scraped_at
+            ''', rows)
+
+    def read(self, district: Optional[str] = None, city: Optional[str] = None, min_price: Optional[float] = None,
+             max_price: Optional[float] = None, scraped_since: Optional[str] = None, changed_since: Optional[str] = None,
+             columns: List[str] = RECORD_COLUMNS) -> pd.DataFrame:
+        """Read offers, filters are evaluated by SQLite using the indexes.
+        :param district: Only offers in this district
+        :param city: Only offers in this city
+        :param min_price: Only offers with at least this price
+        :param max_price: Only offers with at most this price
+        :param scraped_since: Only offers scraped at or after this ISO timestamp
+        :param changed_since: Only offers new or changed at or after this ISO timestamp
+        :param columns: Columns to read, `basic_info` and `details` are decoded into lists and dictionaries
+        :return: DataFrame of offers ordered by URL
+        """
+        conditions, parameters = [], []
+        for condition, value in (('district = ?', district), ('city = ?', city), ('price_value >= ?', min_price), ('price_value <= ?', max_price),
+                                 ('scraped_at >= ?', scraped_since), ('updated_at >= ?', changed_since)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        query = f"SELECT {', '.join(columns)} FROM listings"
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        data = pd.read_sql_query(query + ' ORDER BY url', self.connection, params=parameters)
+        return self._decode(data)
+
+    def iter_chunks(self, chunksize: int, columns: List[str] = RECORD_COLUMNS) -> Iterator[pd.DataFrame]:
+        """Read all offers ordered by URL in chunks of at most `chunksize` rows.
+        :param chunksize: Number of offers per chunk
+        :param columns: Columns to read
+        :return: Iterator of DataFrames
+        """
+        query = f"SELECT {', '.join(columns)} FROM listings ORDER BY url"
+        for data in pd.read_sql_query(query, self.connection, chunksize=chunksize):
+            yield self._decode(data)
+
+    @staticmethod
+    def _decode(data: pd.DataFrame) -> pd.DataFrame:
+        """Decode the JSON columns `basic_info` and `details` into lists and dictionaries."""
+        for column in ('basic_info', 'details'):
+            if column in data:
+                data[column] = data[column].map(json.loads)
+        return data
+
+    def count(self) -> int:
+        """Return the number of stored offers."""
+        return self.connection.execute('SELECT COUNT(*) FROM listings').fetchone()[0]
+
+    def write_cleaned(self, data: pd.DataFrame, append: bool = False) -> None:
+        """Replace the cleaned dataset with the output of the cleaning stage.
+        :param data: Cleaned and formatted offers
+        :param append: Append to the cleaned dataset instead, used by the chunked cleaning
+        """
+        with self.connection:
+            data.to_sql('cleaned_listings', self.connection, if_exists='append' if append else 'replace', index=False)
+            self.connection.execute('CREATE INDEX IF NOT EXISTS cleaned_listings_location ON cleaned_listings (location)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS cleaned_listings_price ON cleaned_listings (price)')
+
+    def read_cleaned(self, location: Optional[str] = None, min_price: Optional[float] = None,
+                     max_price: Optional[float] = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Read the cleaned dataset.
+        :param location: Only offers in this district
+        :param min_price: Only offers with at least this price
+        :param max_price: Only offers with at most this price
+        :param columns: Columns to read, all by default
+        :return: DataFrame of cleaned offers
+        """
+        conditions, parameters = [], []
+        for condition, value in (('location = ?', location), ('price >= ?', min_price), ('price <= ?', max_price)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        query = f"SELECT {', '.join(columns) if columns else '*'} FROM cleaned_listings" + (' WHERE ' + ' AND '.join(conditions) if conditions else '')
+        return pd.read_sql_query(query, self.connection, params=parameters)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def stored_rows(path: str = LISTINGS_PATH, table: str = 'listings') -> int:
+    """Count the rows of a table of a listing store without creating the store.
+    :param path: Path to the listing store
+    :param table: 'listings' for the scraped offers, 'cleaned_listings' for the cleaned dataset
+    :return: Number of rows, 0 if the store or the table doesn't exist
+    """
+    if not os.path.exists(path):
+        return 0
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        return connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        connection.close()
+
+
+def open_store(path: str = LISTINGS_PATH, table: str = 'listings') -> ListingStore:
+    """Open a listing store for reading, unlike `ListingStore` a missing store isn't created.
+    :param path: Path to the listing store
+    :param table: Table which has to hold rows, 'listings' or 'cleaned_listings'
+    :return: The listing store
+    :raise FileNotFoundError: If the store doesn't exist
+    :raise ValueError: If the table is empty
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Listing store {path} doesn't exist")
+    if not stored_rows(path, table):
+        raise ValueError(f"Listing store {path} has no rows in {table}")
+    return ListingStore(path)
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import os
+from typing import Dict, List, Optional
+import aiohttp
+from data_scrapping import HEADERS, search_pages, get_page_count
+from async_scrapping import fetch_page, crawl
+from crawl_state import CrawlState
+from offer_sink import open_sink
+from page_archive import PageArchive
+from rate_limiter import AdaptiveRateLimiter
+from scrape_metrics import ScrapeMetrics
+
+CITIES_FILE = 'cities.json'
+OUTPUT_DIR = 'offers'
+
+
+def load_cities(path: str = CITIES_FILE) -> List[Dict]:
+    """Load the crawl configuration.
+    The file holds a list of cities, every city has a `city` name used for its output partition, a `search_url`
+    with a `{}` placeholder for the page number and an optional `max_pages` limit (null to crawl all discovered pages).
+    :param path: Path to the JSON configuration
+    :return: List of city definitions
+    """
+    with open(path, encoding='utf-8') as f:
+        cities = json.load(f)
+    names = [city['city'] for city in cities]
+    if len(names) != len(set(names)):
+        raise ValueError(f"Duplicate city names in {path}")
+    return cities
+
+
+def partition_dir(output_dir: str, city: str) -> str:
+    """Return the directory of a city's partition (`<output_dir>/city=<city>`)."""
+    return os.path.join(output_dir, f'city={city}')
+
+
+def partition_path(output_dir: str, city: str, extension: str = '.jsonl') -> str:
+    """Return the path of a city's offer file.
+    :param output_dir: Root directory of the partitioned output
+    :param city: Name of the city
+    :param extension: Output format ('.jsonl', '.parquet' or '.csv')
+    :return: Path to the offer file of the city
+    """
+    return os.path.join(partition_dir(output_dir, city), f'offer_details{extension}')
+
+
+def city_partitions(output_dir: str = OUTPUT_DIR, extension: str = '.jsonl') -> Dict[str, str]:
+    """Find the offer files of all crawled cities, so downstream stages can process one city at a time.
+    :param output_dir: Root directory of the partitioned output
+    :param extension: Output format
+    :return: Dictionary of city name and path to its offer file
+    """
+    partitions = {}
+    if os.path.isdir(output_dir):
+        for name in sorted(os.listdir(output_dir)):
+            if name.startswith('city='):
+                city = name[len('city='):]
+                path = partition_path(output_dir, city, extension)
+                if os.path.exists(path):
+                    partitions[city] = path
+    return partitions
+
+
+async def discover_page_count(search_url: str, timeout: float = 30, archive: Optional[PageArchive] = None,
+                              limiter: Optional[AdaptiveRateLimiter] = None, metrics: Optional[ScrapeMetrics] = None) -> int:
+    """Fetch the first search page and read the number of result pages from its pagination.
+    :param search_url: Search URL with a `{}` placeholder for the page number
+    :param timeout: Total timeout of the request in seconds
+    :param archive: Archive of fetched pages
+    :param limiter: Shared rate limiter
+    :param metrics: Crawl metrics
+    :return: Number of search result pages
+    :raise ConnectionError: If the first page could not be fetched
+    """
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(headers=HEADERS, timeout=client_timeout) as session:
+        content = await fetch_page(session, search_url.format(1), asyncio.Semaphore(1), archive=archive, kind='search',
+                                   limiter=limiter, metrics=metrics)
+    if content is None:
+        raise ConnectionError(f"First search page {search_url.format(1)} could not be fetched")
+    return get_page_count(content)
+
+
+async def crawl_city(city: Dict, output_dir: str = OUTPUT_DIR, concurrency: int = 16, extension: str = '.jsonl',
+                     archive: Optional[PageArchive] = None, limiter: Optional[AdaptiveRateLimiter] = None,
+                     incremental: bool = True) -> Dict:
+    """Crawl a single city as an independent shard.
+    Offers, the crawl state and the metrics of the city are kept in its own partition directory,
+    so a failed or interrupted city can be resumed without touching the other cities.
+    :param city: City definition (see `load_cities`)
+    :param output_dir: Root directory of the partitioned output
+    :param concurrency: Maximum number of requests in flight for this city
+    :param extension: Output format
+    :param archive: Archive of fetched pages, shared by all cities
+    :param limiter: Rate limiter, shared by all cities (it keeps a separate state for every host)
+    :param incremental: Keep a crawl state in the partition to resume and skip unchanged offers
+    :return: Summary of the shard
+    :raise ConnectionError: If the first search page could not be fetched, nothing of the city is crawled then
+    """
+    directory = partition_dir(output_dir, city['city'])
+    os.makedirs(directory, exist_ok=True)
+    metrics = ScrapeMetrics(os.path.join(directory, 'crawl_metrics.json'))
+    try:
+        page_count = await discover_page_count(city['search_url'], archive=archive, limiter=limiter, metrics=metrics)
+    except ConnectionError:
+        # The failed requests are kept in the metrics of the city
+        metrics.dump()
+        raise
+    if city.get('max_pages'):
+        page_count = min(page_count, city['max_pages'])
+    metrics.extra['pages_discovered'] = page_count
+
+    state = CrawlState(os.path.join(directory, 'crawl_state.sqlite')) if incremental else None
+    try:
+        with open_sink(partition_path(output_dir, city['city'], extension), city=city['city']) as sink:
+            await crawl(search_pages(city['search_url'], page_count), concurrency=concurrency, archive=archive, state=state,
+                        sink=sink, limiter=limiter, metrics=metrics)
+    finally:
+        if state is not None:
+            state.close()
+    return {'city': city['city'], 'pages': page_count, 'offers': sink.written}
+
+
+async def crawl_cities(cities: List[Dict], output_dir: str = OUTPUT_DIR, concurrency: int = 16, extension: str = '.jsonl',
+                       archive: Optional[PageArchive] = None, limiter: Optional[AdaptiveRateLimiter] = None,
+                       incremental: bool = True) -> List[Dict]:
+    """Crawl all cities in parallel, every city is a shard writing to its own partition.
+    A failing city doesn't stop the others, its summary holds the error instead.
+    :param cities: City definitions (see `load_cities`)
+    :param output_dir: Root directory of the partitioned output
+    :param concurrency: Maximum number of requests in flight per city
+    :param extension: Output format
+    :param archive: Archive of fetched pages
+    :param limiter: Shared rate limiter
+    :param incremental: Resume and skip unchanged offers using a crawl state per city
+    :return: Summary of every shard
+    """
+    results = await asyncio.gather(*(crawl_city(city, output_dir, concurrency, extension, archive, limiter, incremental)
+                                     for city in cities), return_exceptions=True)
+    summaries = []
+    for city, result in zip(cities, results):
+        if isinstance(result, Exception):
+            print(f"Crawl of {city['city']} failed: {result!r}")
+            result = {'city': city['city'], 'error': repr(result)}
+        summaries.append(result)
+    return summaries
+
+
+def run_crawl_cities(cities: List[Dict], output_dir: str = OUTPUT_DIR, concurrency: int = 16, extension: str = '.jsonl',
+                     archive: Optional[PageArchive] = None, limiter: Optional[AdaptiveRateLimiter] = None,
+                     incremental: bool = True) -> List[Dict]:
+    """Run the sharded multi-city crawl from synchronous code and print a summary of every city.
+    :param cities: City definitions (see `load_cities`)
+    :param output_dir: Root directory of the partitioned output
+    :param concurrency: Maximum number of requests in flight per city
+    :param extension: Output format
+    :param archive: Archive of fetched pages
+    :param limiter: Shared rate limiter
+    :param incremental: Resume and skip unchanged offers using a crawl state per city
+    :return: Summary of every shard
+    """
+    summaries = asyncio.run(crawl_cities(cities, output_dir, concurrency, extension, archive, limiter, incremental))
+    for summary in summaries:
+        print(summary)
+    return summaries
+
+
+if __name__ == '__main__':
+    run_crawl_cities(load_cities(), archive=PageArchive('archive'), limiter=AdaptiveRateLimiter())
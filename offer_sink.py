@@ -0,0 +1,190 @@
+import csv
+import json
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional
+import pandas as pd
+from listing_store import ListingStore, open_store
+
+
+class OfferSink(ABC):
+    """Buffered writer of scraped offers.
+    Offers are kept in memory and written in chunks of `batch_size` records, subclasses implement `_write_batch`.
+    Every record is a structured dictionary: `url`, `scraped_at`, the scalar offer fields,
+    `basic_info` as a list of strings and `details` as a dictionary.
+    Functions in `on_flush` are called after every flush, e.g. to commit crawl checkpoints of the written offers.
+    """
+
+    def __init__(self, path: str, batch_size: int = 500):
+        self.path = path
+        self.batch_size = batch_size
+        self.buffer: List[Dict] = []
+        self.written = 0
+        self.on_flush: List[Callable[[], None]] = []
+
+    def write(self, offer_details: Optional[Dict], url: Optional[str] = None) -> None:
+        """Add an offer to the buffer and flush it if it is full.
+        :param offer_details: Dictionary of offer details
+        :param url: URL of the offer page
+        """
+        if offer_details:
+            record = {'url': url, 'scraped_at': datetime.now(timezone.utc).isoformat(timespec='seconds')}
+            record.update(offer_details)
+            self.buffer.append(record)
+            if len(self.buffer) >= self.batch_size:
+                self.flush()
+
+    def flush(self) -> None:
+        """Write all buffered offers."""
+        if self.buffer:
+            self._write_batch(self.buffer)
+            self.written += len(self.buffer)
+            self.buffer = []
+        for callback in self.on_flush:
+            callback()
+
+    def close(self) -> None:
+        """Flush the remaining offers and release the output file."""
+        self.flush()
+
+    @abstractmethod
+    def _write_batch(self, records: List[Dict]) -> None:
+        """Write a batch of records to the output."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class JsonLinesSink(OfferSink):
+    """Append offers to a JSON Lines file, one offer per line with nested `basic_info` and `details`."""
+
+    def _write_batch(self, records: List[Dict]) -> None:
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+
+
+class ParquetSink(OfferSink):
+    """Write offers to a Parquet file, every flush is written as a separate row group.
+    `basic_info` is stored as a list of strings and `details` as a map of strings.
+    """
+
+    def __init__(self, path: str, batch_size: int = 5000):
+        super().__init__(path, batch_size)
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self.schema = pa.schema([
+            ('url', pa.string()),
+            ('scraped_at', pa.string()),
+            ('title', pa.string()),
+            ('price', pa.string()),
+            ('area', pa.string()),
+            ('interest_level', pa.string()),
+            ('basic_info', pa.list_(pa.string())),
+            ('details', pa.map_(pa.string(), pa.string())),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def _write_batch(self, records: List[Dict]) -> None:
+        records = [dict(record, details=list(record['details'].items())) for record in records]
+        self.writer.write_table(self._pa.Table.from_pylist(records, schema=self.schema))
+
+    def close(self) -> None:
+        super().close()
+        self.writer.close()
+
+
+class CsvSink(OfferSink):
+    """Append offers to a CSV file in the legacy `save_to_csv` layout (no header, no URL, stringified lists)."""
+
+    def _write_batch(self, records: List[Dict]) -> None:
+        with open(self.path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerows([record['title'], record['price'], record['area'], record['interest_level'],
+                              str(record['basic_info']), str(record['details'])] for record in records)
+
+
+class ListingStoreSink(OfferSink):
+    """Upsert offers of a city into a `ListingStore`, every flush is a single transaction."""
+
+    def __init__(self, path: str, batch_size: int = 500, city: str = 'wroclaw'):
+        super().__init__(path, batch_size)
+        self.city = city
+        self.store = ListingStore(path)
+
+    def _write_batch(self, records: List[Dict]) -> None:
+        self.store.upsert(records, self.city)
+
+    def close(self) -> None:
+        super().close()
+        self.store.close()
+
+
+def open_sink(path: str, batch_size: Optional[int] = None, city: Optional[str] = None) -> OfferSink:
+    """Create a sink matching the file extension of the path ('.jsonl', '.parquet', '.csv' or '.sqlite').
+    :param path: Output file path
+    :param batch_size: Number of offers written at once, the sink default if None
+    :param city: City of the offers, the listing store resolves their districts with its gazetteer (Wrocław if None);
+        the other formats keep the offers of a city in its own file
+    :return: Offer sink
+    """
+    sinks = {'.jsonl': JsonLinesSink, '.parquet': ParquetSink, '.csv': CsvSink, '.sqlite': ListingStoreSink}
+    extension = os.path.splitext(path)[1]
+    if extension not in sinks:
+        raise ValueError(f"Unsupported offer output format: {extension}")
+    kwargs = {} if batch_size is None else {'batch_size': batch_size}
+    if city is not None and sinks[extension] is ListingStoreSink:
+        kwargs['city'] = city
+    return sinks[extension](path, **kwargs)
+
+
+def load_offers(path: str) -> pd.DataFrame:
+    """Load offers written by `JsonLinesSink`, `ParquetSink` or `ListingStoreSink`.
+    `basic_info` is loaded as lists and `details` as dictionaries, so they don't need to be parsed again.
+    :param path: Path to a '.jsonl', '.parquet' or '.sqlite' file
+    :return: DataFrame of offers
+    """
+    if path.endswith('.sqlite'):
+        with open_store(path) as store:
+            return store.read()
+    if path.endswith('.parquet'):
+        data = pd.read_parquet(path)
+        data['basic_info'] = data['basic_info'].apply(list)
+        data['details'] = data['details'].apply(dict)
+        return data
+    with open(path, encoding='utf-8') as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+
+def iter_offers(path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Load offers like `load_offers`, but in chunks of at most `chunksize` rows, so memory use doesn't depend on the file size.
+    :param path: Path to a '.jsonl', '.parquet' or '.sqlite' file
+    :param chunksize: Number of offers per chunk
+    :return: Iterator of DataFrames
+    """
+    if path.endswith('.sqlite'):
+        with open_store(path) as store:
+            yield from store.iter_chunks(chunksize)
+        return
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            data = batch.to_pandas()
+            data['basic_info'] = data['basic_info'].apply(list)
+            data['details'] = data['details'].apply(dict)
+            yield data
+        return
+    with open(path, encoding='utf-8') as f:
+        records = []
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+                if len(records) == chunksize:
+                    yield pd.DataFrame(records)
+                    records = []
+        if records:
+            yield pd.DataFrame(records)
@@ -0,0 +1,84 @@
+import os
+from typing import Dict, List, Optional, Tuple
+import joblib
+import numpy as np
+import pandas as pd
+
+FILTER_PATH = 'others/outlier_filter.pkl'
+
+# Fixed ranges of the modelled market (inclusive, None for no limit), applied on top of the IQR bounds
+LIMITS = {
+    'price': (100_000, 1_250_000),
+    'area': (None, 80),
+    'floor': (None, 29),
+    'rooms': (None, 7),
+    'year': (1925, None),
+}
+
+
+class OutlierFilter:
+    """Outlier filter fitted on the training data.
+    The bounds of every numeric column are the IQR range widened by `multiplier` (Q1 - m * IQR, Q3 + m * IQR),
+    computed from the quartiles of all columns in a single pass, and narrowed by the fixed `limits`.
+    Binary columns (at most two distinct values) only get the fixed limits, their IQR is meaningless.
+    The fitted filter is saved next to the encoders, so training, charts and input checks share the same bounds.
+    """
+
+    def __init__(self, multiplier: float = 3, limits: Dict[str, Tuple[Optional[float], Optional[float]]] = LIMITS):
+        self.multiplier = multiplier
+        self.limits = limits
+        self.bounds: Dict[str, Tuple[float, float]] = {}
+
+    def fit(self, data: pd.DataFrame) -> 'OutlierFilter':
+        """Compute the bounds of the numeric columns of the data.
+        :param data: Cleaned offers
+        :return: The fitted filter
+        """
+        numeric = data.select_dtypes(include='number')
+        quartiles = numeric.quantile([0.25, 0.75])
+        iqr = quartiles.loc[0.75] - quartiles.loc[0.25]
+        lower = quartiles.loc[0.25] - self.multiplier * iqr
+        upper = quartiles.loc[0.75] + self.multiplier * iqr
+        binary = numeric.nunique() <= 2
+        lower[binary], upper[binary] = -np.inf, np.inf
+        for column, (low, high) in self.limits.items():
+            if column in lower:
+                lower[column] = max(lower[column], low) if low is not None else lower[column]
+                upper[column] = min(upper[column], high) if high is not None else upper[column]
+        self.bounds = {column: (float(lower[column]), float(upper[column])) for column in numeric.columns}
+        return self
+
+    def mask(self, data: pd.DataFrame) -> pd.Series:
+        """Return True for the offers within the bounds of all fitted columns present in the data."""
+        columns = [column for column in self.bounds if column in data.columns]
+        lower = pd.Series({column: self.bounds[column][0] for column in columns}, dtype=float)
+        upper = pd.Series({column: self.bounds[column][1] for column in columns}, dtype=float)
+        values = data[columns]
+        return (values.ge(lower) & values.le(upper)).all(axis=1)
+
+    def transform(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Remove the offers outside the bounds."""
+        return data[self.mask(data)]
+
+    def fit_transform(self, data: pd.DataFrame) -> pd.DataFrame:
+        return self.fit(data).transform(data)
+
+    def violations(self, values: Dict[str, float]) -> List[Tuple[str, float, float]]:
+        """Check a single offer, e.g. the input of a prediction.
+        :param values: Dictionary of column name and value, columns without bounds are ignored
+        :return: List of column name, lower and upper bound of every value outside the bounds
+        """
+        return [(column, *self.bounds[column]) for column, value in values.items()
+                if column in self.bounds and not self.bounds[column][0] <= value <= self.bounds[column][1]]
+
+    def save(self, path: str = FILTER_PATH) -> None:
+        joblib.dump(self, path)
+
+    @staticmethod
+    def load(path: str = FILTER_PATH) -> 'OutlierFilter':
+        return joblib.load(path)
+
+
+def load_or_fit(data: pd.DataFrame, path: str = FILTER_PATH) -> OutlierFilter:
+    """Load the filter saved by the training or, if the models weren't trained yet, fit it on the data."""
+    return OutlierFilter.load(path) if os.path.exists(path) else OutlierFilter().fit(data)
@@ -0,0 +1,112 @@
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Optional, Tuple
+
+
+class PageArchive:
+    """On-disk archive of fetched pages.
+    Every page is stored gzip-compressed under `<root>/<url hash>/<fetch time>.html.gz` together with
+    a `meta.json` file holding the URL, the page kind and the HTTP validators used for revalidation.
+    """
+
+    def __init__(self, root: str = 'archive'):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def url_key(url: str) -> str:
+        """Return the hash used as directory name for the given URL."""
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _url_dir(self, url: str) -> str:
+        return os.path.join(self.root, self.url_key(url))
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes) -> None:
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def meta(self, url: str) -> Optional[Dict]:
+        """Return the archive metadata of the URL or None if it was never archived.
+        :param url: URL of the page
+        :return: Dictionary with `url`, `kind`, `etag`, `last_modified`, `fetched_at` and `revalidated_at`
+        """
+        path = os.path.join(self._url_dir(url), 'meta.json')
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_meta(self, url: str, meta: Dict) -> None:
+        self._write_atomic(os.path.join(self._url_dir(url), 'meta.json'), json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+
+    def store(self, url: str, content: bytes, kind: str = 'page', etag: Optional[str] = None, last_modified: Optional[str] = None) -> str:
+        """Store a freshly fetched page.
+        :param url: URL of the page
+        :param content: Raw HTML content
+        :param kind: Kind of the page, e.g. 'search' or 'offer'
+        :param etag: Value of the ETag response header
+        :param last_modified: Value of the Last-Modified response header
+        :return: Path of the stored snapshot
+        """
+        url_dir = self._url_dir(url)
+        os.makedirs(url_dir, exist_ok=True)
+        fetched_at = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+        path = os.path.join(url_dir, f'{fetched_at}.html.gz')
+        self._write_atomic(path, gzip.compress(content))
+        self._save_meta(url, {
+            'url': url,
+            'kind': kind,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': fetched_at,
+            'revalidated_at': fetched_at,
+        })
+        return path
+
+    def mark_revalidated(self, url: str) -> None:
+        """Record that the server confirmed the archived copy is still current (HTTP 304)."""
+        meta = self.meta(url)
+        if meta is not None:
+            meta['revalidated_at'] = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+            self._save_meta(url, meta)
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Return the If-None-Match/If-Modified-Since headers for revalidating the archived copy."""
+        meta = self.meta(url)
+        headers = {}
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def latest(self, url: str) -> Optional[bytes]:
+        """Return the most recently fetched content of the URL or None if it was never archived."""
+        meta = self.meta(url)
+        if meta is None:
+            return None
+        with gzip.open(os.path.join(self._url_dir(url), f"{meta['fetched_at']}.html.gz"), 'rb') as f:
+            return f.read()
+
+    def iter_latest(self, kind: Optional[str] = None) -> Iterator[Tuple[str, bytes]]:
+        """Iterate over the latest snapshot of every archived URL, sorted by URL.
+        :param kind: Only yield pages of this kind
+        :return: Iterator of (URL, content) tuples
+        """
+        metas = []
+        for entry in os.scandir(self.root):
+            meta_path = os.path.join(entry.path, 'meta.json')
+            if entry.is_dir() and os.path.exists(meta_path):
+                with open(meta_path, encoding='utf-8') as f:
+                    meta = json.load(f)
+                if kind is None or meta['kind'] == kind:
+                    metas.append(meta)
+        for meta in sorted(metas, key=lambda m: m['url']):
+            yield meta['url'], self.latest(meta['url'])
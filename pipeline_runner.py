@@ -0,0 +1,276 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import pandas as pd
+from cleaned_dataset import DATASET_PATH
+from file_hashing import file_hash
+
+CACHE_DIR = '.stage_cache'
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Encoders, scalers and models written by `prediction_models.fit_and_save`
+MODEL_ARTIFACTS = ['others/location_encoder.pkl', 'others/state_encoder.pkl', 'others/market_encoder.pkl',
+                   'others/scaler_X.pkl', 'others/scaler_y.pkl', 'others/outlier_filter.pkl', 'models/Linear_Regression.txt',
+                   'models/Random_Forest_Regressor.txt', 'models/Gradient_Boosting_Regressor.txt',
+                   'models/Optimized_SVR.txt', 'models/neural_network_model.keras']
+
+
+def imported_modules(path: str, root: str = PROJECT_ROOT) -> List[str]:
+    """Find the project modules a module depends on: the modules it imports, also within functions, and the modules
+    these import in turn. Modules outside the project (standard library, installed packages) are skipped.
+    :param path: Path of the module relative to `root`, e.g. 'data_clearing.py'
+    :param root: Project root
+    :return: Sorted relative paths of the module and of the project modules it depends on
+    """
+    found, pending = set(), [path]
+    while pending:
+        current = pending.pop()
+        if current in found or not os.path.exists(os.path.join(root, current)):
+            continue
+        found.add(current)
+        with open(os.path.join(root, current), encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                pending += [alias.name.replace('.', '/') + '.py' for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                pending.append(node.module.replace('.', '/') + '.py')
+    return sorted(found)
+
+
+# Source files defining the behaviour of the stages, a change of any of them invalidates the cached outputs
+CLEANING_CODE = imported_modules('data_clearing.py')
+TRAINING_CODE = imported_modules('prediction_models.py')
+
+
+class Stage:
+    """A step of the pipeline: a function reading the `inputs` files and writing the `outputs` files.
+    Stages depend on the stages producing their inputs, files produced by no stage (e.g. the scraped offers) are
+    sources of the pipeline.
+    """
+
+    def __init__(self, name: str, function: Callable, inputs: List[str], outputs: List[str], code: List[str],
+                 params: Optional[Dict] = None):
+        """
+        :param name: Unique name of the stage
+        :param function: Function running the stage, called with `params` as keyword arguments
+        :param inputs: Paths of the files read by the stage
+        :param outputs: Paths of the files written by the stage
+        :param code: Source files of the stage relative to the project root, their content versions the stage
+        :param params: JSON serializable parameters of the stage
+        """
+        self.name = name
+        self.function = function
+        self.inputs = inputs
+        self.outputs = outputs
+        self.code = code
+        self.params = params or {}
+
+    def key(self) -> str:
+        """Hash the stage definition, its code, the library versions and the content of its inputs."""
+        missing = [path for path in self.inputs if not os.path.exists(path)]
+        if missing:
+            raise FileNotFoundError(f"Inputs of stage {self.name} don't exist: {', '.join(missing)}")
+        definition = {
+            'stage': self.name,
+            'params': self.params,
+            'outputs': self.outputs,
+            'code': {path: file_hash(os.path.join(PROJECT_ROOT, path)) for path in self.code},
+            'libraries': {'pandas': pd.__version__, 'numpy': np.__version__},
+            'inputs': {path: file_hash(path) for path in self.inputs},
+        }
+        return hashlib.sha256(json.dumps(definition, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class Pipeline:
+    """DAG of stages with a content-addressed cache of their outputs.
+    Every run of a stage is recorded under the hash of its inputs, code and parameters (see `Stage.key`) together
+    with the hashes of the outputs, which are kept in an object store. A stage whose key was seen before is skipped,
+    its outputs are restored from the store if the files on disk differ. As keys depend on the content of the inputs,
+    a stage re-run with an identical result doesn't invalidate the stages downstream.
+    Layout of the cache directory:
+    - `objects/<hash[:2]>/<hash>` - output files by their content hash
+    - `stages/<stage>/<key>.json` - outputs of a stage run
+    """
+
+    def __init__(self, stages: List[Stage], cache_dir: str = CACHE_DIR):
+        self.stages = {}
+        producers = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage name {stage.name}")
+            for path in stage.outputs:
+                if path in producers:
+                    raise ValueError(f"{path} is written by both {producers[path]} and {stage.name}")
+                producers[path] = stage.name
+            self.stages[stage.name] = stage
+        self.dependencies = {stage.name: sorted({producers[path] for path in stage.inputs if path in producers})
+                             for stage in stages}
+        self.order = self._topological_order()
+        self.cache_dir = cache_dir
+
+    def _topological_order(self) -> List[str]:
+        """Order the stages so every stage comes after its dependencies, in definition order otherwise."""
+        order, done = [], set()
+        remaining = list(self.stages)
+        while remaining:
+            ready = [name for name in remaining if set(self.dependencies[name]) <= done]
+            if not ready:
+                raise ValueError(f"Stages {', '.join(remaining)} form a cycle")
+            order.extend(ready)
+            done.update(ready)
+            remaining = [name for name in remaining if name not in done]
+        return order
+
+    def upstream(self, targets: List[str]) -> List[str]:
+        """Return the target stages and all stages they depend on in execution order."""
+        needed, pending = set(), list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in self.stages:
+                raise KeyError(f"Unknown stage {name}")
+            if name not in needed:
+                needed.add(name)
+                pending.extend(self.dependencies[name])
+        return [name for name in self.order if name in needed]
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, 'objects', digest[:2], digest)
+
+    def _manifest_path(self, stage: Stage, key: str) -> str:
+        return os.path.join(self.cache_dir, 'stages', stage.name, f'{key}.json')
+
+    def _store(self, path: str) -> str:
+        """Copy an output file into the object store and return its hash."""
+        digest = file_hash(path)
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            shutil.copyfile(path, object_path + '.tmp')
+            os.replace(object_path + '.tmp', object_path)
+        return digest
+
+    def _restore(self, manifest: Dict) -> bool:
+        """Bring the output files to the recorded versions.
+        :return: False if a recorded object is missing from the store
+        """
+        outputs = manifest['outputs']
+        if not all(os.path.exists(self._object_path(digest)) for digest in outputs.values()):
+            return False
+        for path, digest in outputs.items():
+            if file_hash(path) != digest:
+                if os.path.dirname(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                shutil.copyfile(self._object_path(digest), path)
+        return True
+
+    def run_stage(self, stage: Stage, force: bool = False) -> str:
+        """Run a stage unless its outputs are cached.
+        :param stage: Stage to run
+        :param force: Run the stage even if its outputs are cached
+        :return: 'cached' or 'ran'
+        """
+        key = stage.key()
+        manifest_path = self._manifest_path(stage, key)
+        if not force and os.path.exists(manifest_path):
+            with open(manifest_path, encoding='utf-8') as f:
+                if self._restore(json.load(f)):
+                    return 'cached'
+
+        start = time.perf_counter()
+        stage.function(**stage.params)
+        missing = [path for path in stage.outputs if not os.path.exists(path)]
+        if missing:
+            raise RuntimeError(f"Stage {stage.name} didn't write {', '.join(missing)}")
+        manifest = {
+            'stage': stage.name,
+            'key': key,
+            'outputs': {path: self._store(path) for path in stage.outputs},
+            'seconds': round(time.perf_counter() - start, 3),
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        }
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(manifest_path + '.tmp', manifest_path)
+        return 'ran'
+
+    def run(self, targets: Optional[List[str]] = None, force: Optional[List[str]] = None) -> Dict[str, str]:
+        """Run the stages needed for the targets in dependency order, skipping the cached ones.
+        :param targets: Stages to bring up to date, all stages by default
+        :param force: Stages to run even if their outputs are cached
+        :return: Dictionary of stage name and 'cached' or 'ran'
+        """
+        force = set(force or [])
+        results = {}
+        for name in self.upstream(targets or self.order):
+            start = time.perf_counter()
+            results[name] = self.run_stage(self.stages[name], force=name in force)
+            print(f"{name}: {results[name]} ({time.perf_counter() - start:.2f} s)")
+        return results
+
+
+# -------Stages of the apartment pipeline-------
+def extract_stage(filepath: str) -> None:
+    from data_clearing import extract_information
+    extract_information(filepath)
+
+
+def format_stage(remove_duplicates: bool = False, city: str = 'wroclaw') -> None:
+    from data_clearing import clear_format_data, location_to_district
+    clear_format_data(remove_duplicates=remove_duplicates, city=city)
+    location_to_district(city=city)
+
+
+def train_stage(filepath: str) -> None:
+    from prediction_models import fit_and_save
+    fit_and_save(filepath)
+
+
+def default_pipeline(raw_path: str = 'offer_details.csv', cache_dir: str = CACHE_DIR,
+                     remove_duplicates: bool = False, city: Optional[str] = None) -> Pipeline:
+    """Build the scrape -> clean -> train pipeline.
+    Scraping isn't a stage: it depends on the website rather than on files, its output `raw_path` is the source.
+    :param raw_path: Path to the scraped offers (see `data_clearing.load_raw_offers`)
+    :param cache_dir: Directory of the stage cache
+    :param remove_duplicates: Remove near-duplicate offers in the 'format' stage
+    :param city: City of the offers whose gazetteer resolves the districts, by default the city of a shard of the
+        multi-city crawl or Wrocław (see `data_clearing.raw_city`)
+    :return: Pipeline with the stages 'extract', 'format' and 'train'
+    """
+    if city is None:
+        from data_clearing import raw_city
+        city = raw_city(raw_path)
+    return Pipeline([
+        Stage('extract', extract_stage, inputs=[raw_path], outputs=['data_cleaned.csv'], code=CLEANING_CODE,
+              params={'filepath': raw_path}),
+        Stage('format', format_stage, inputs=['data_cleaned.csv'], code=CLEANING_CODE,
+              outputs=['data_cleaned_formated.csv', 'data_quarantine.csv', DATASET_PATH]
+              + (['data_duplicates.csv'] if remove_duplicates else []),
+              params={'remove_duplicates': remove_duplicates, 'city': city}),
+        Stage('train', train_stage, inputs=[DATASET_PATH], outputs=MODEL_ARTIFACTS, code=TRAINING_CODE,
+              params={'filepath': DATASET_PATH}),
+    ], cache_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the stages of the pipeline whose inputs or code changed.')
+    parser.add_argument('targets', nargs='*', help='Stages to bring up to date (default: all)')
+    parser.add_argument('--raw', default=None, help="Scraped offers, by default the listing store if it holds offers, "
+                                                     "otherwise 'offer_details.csv'")
+    parser.add_argument('--force', nargs='*', default=[], help='Stages to run even if cached')
+    parser.add_argument('--remove-duplicates', action='store_true', help='Remove near-duplicate offers')
+    parser.add_argument('--city', default=None, help="City of the offers whose gazetteer resolves the districts, by "
+                                                      "default the city of a multi-city crawl shard or 'wroclaw'")
+    args = parser.parse_args()
+    if args.raw is None:
+        from data_clearing import default_raw_path
+        args.raw = default_raw_path()
+    default_pipeline(args.raw, remove_duplicates=args.remove_duplicates, city=args.city).run(args.targets or None, args.force)
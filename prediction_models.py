@@ -1,4 +1,5 @@
 import os
+import json
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -13,7 +14,11 @@ from sklearn.metrics import mean_absolute_error
 from tensorflow.keras.models import Sequential, load_model
 from tensorflow.keras.layers import Dense, Dropout
 from tensorflow.keras.optimizers import Adam
-from data_analysis import show_unique_values
+from dataset_profile import cached_profile, print_profile
+from data_clearing import load_cleaned_data
+from cleaned_dataset import dataset_path
+from outlier_filter import OutlierFilter, load_or_fit
+from file_hashing import file_hash
 
 
 # -------Directories setup-------
@@ -26,40 +31,24 @@ def setup_directories() -> None:
 
 
 # -------Data preprocessing-------
-def remove_outliers_wider(df: pd.DataFrame, multiplier: int = 3) -> pd.DataFrame:
-    """Remove outliers from the dataset using the IQR method with a wider range.
-    :param df: DataFrame to remove outliers from
-    :param multiplier: Multiplier for the IQR range
-    :return: DataFrame without outliers
-    """
-    numeric_columns = df.select_dtypes(include=['float64', 'int64']).columns
-    for column in numeric_columns:
-        Q1 = df[column].quantile(0.25)
-        Q3 = df[column].quantile(0.75)
-        IQR = Q3 - Q1
-        lower_bound = Q1 - multiplier * IQR
-        upper_bound = Q3 + multiplier * IQR
-        df = df[(df[column] >= lower_bound) & (df[column] <= upper_bound)]
-    return df
-
-
-def load_and_preprocess_data(filepath: str) -> tuple[pd.DataFrame, dict[str, LabelEncoder]]:
+def load_and_preprocess_data(filepath: str, train: bool = True) -> tuple[pd.DataFrame, dict[str, LabelEncoder]]:
     """Load the dataset from the given filepath, preprocess it and return the preprocessed data and label encoders.
-    :param filepath: Filepath to the dataset
+    :param filepath: Filepath to the dataset, the Parquet dataset, a cleaned CSV file or a '.sqlite' listing store
+    :param train: Fit the outlier filter on the data and save it, otherwise use the filter the saved models were
+        trained with
     :return: Preprocessed data and label encoders
     """
-    data = pd.read_csv(filepath)
-    data = remove_outliers_wider(data)
-    data = data[(data['price'] <= 1250000)]
-    data = data[(data['price'] >= 100000)]
-    data = data[(data['area'] <= 80)]
-    data = data[(data['floor'] <= 29)]
-    data = data[(data['rooms'] <= 7)]
-    data = data[(data['year'] >= 1925)]
-
-    # For testing purposes
-    for column in ['location', 'rooms', 'floor', 'total_floors', 'year', 'parking', 'state', 'furnished', 'market']:
-        show_unique_values(data, column)
+    data = load_cleaned_data(filepath)
+    if train:
+        outlier_filter = OutlierFilter().fit(data)
+        outlier_filter.save()
+    else:
+        outlier_filter = load_or_fit(data)
+    data = outlier_filter.transform(data)
+
+    # For testing purposes, the profile is computed once per dataset file and outlier bounds
+    version = f"{file_hash(filepath)}:{json.dumps(outlier_filter.bounds, sort_keys=True)}"
+    print_profile(cached_profile(data, version, ['location', 'rooms', 'floor', 'total_floors', 'year', 'parking', 'state', 'furnished', 'market']))
 
     label_encoders = {}
     for column in ['location', 'state', 'market']:
@@ -88,6 +77,20 @@ def prepare_data(data: pd.DataFrame) -> tuple[np.ndarray, np.ndarray, StandardSc
 
 
 # -------Model training and evaluation-------
+def fit_and_save(filepath: str, train: bool = True) -> tuple[dict[str, object], np.ndarray, np.ndarray, StandardScaler]:
+    """Preprocess the cleaned dataset, fit the encoders, scalers and models and save them to `others/` and `models/`.
+    :param filepath: Filepath to the cleaned dataset
+    :param train: Train the models, otherwise load the saved ones
+    :return: Models, scaled test features, scaled test target and the target scaler
+    """
+    setup_directories()
+    data, label_encoders = load_and_preprocess_data(filepath, train)
+    X_scaled, y_scaled, scaler_X, scaler_y = prepare_data(data)
+    X_train_scaled, X_test_scaled, y_train_scaled, y_test_scaled = train_test_split(X_scaled, y_scaled, test_size=0.2, random_state=42)
+    models = train_models(X_train_scaled, y_train_scaled) if train else load_models()
+    return models, X_test_scaled, y_test_scaled, scaler_y
+
+
 def load_models() -> dict[str, object]:
     """Load the trained models from the files.
     :return: Dictionary of loaded models
@@ -379,16 +382,10 @@ def input_pred(location: str, area: float, rooms: int, floor: int, total_floors:
 
 # -------Main-------
 if __name__ == '__main__':
-    setup_directories()
     train = True
-    data, label_encoders = load_and_preprocess_data('data_cleaned_formated.csv')
-    X_scaled, y_scaled, scaler_X, scaler_y = prepare_data(data)
-    X_train_scaled, X_test_scaled, y_train_scaled, y_test_scaled = train_test_split(X_scaled, y_scaled, test_size=0.2, random_state=42)
-
-    if train:
-        models = train_models(X_train_scaled, y_train_scaled)
-    else:
-        models = load_models()
+    # Every cleaning run writes the Parquet dataset, also when the listing store receives the cleaned offers
+    filepath = dataset_path()
+    models, X_test_scaled, y_test_scaled, scaler_y = fit_and_save(filepath, train)
 
     results = evaluate_models(models, X_test_scaled, y_test_scaled, scaler_y)
     print("Models have been trained and saved. MAE scores are calculated and displayed.")
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date.
+    :param value: Value of the header
+    :return: Number of seconds to wait or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class HostState:
+    """Token bucket and adaptive concurrency window of a single host."""
+
+    def __init__(self, rate: float, concurrency: float):
+        self.rate = rate
+        self.tokens = 1.0
+        self.refilled_at = time.monotonic()
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.failures = 0
+        self.slow_start = True
+
+
+class AdaptiveRateLimiter:
+    """Shared per-host rate limiter with AIMD-style adaptive concurrency.
+    Every request takes a token from the host's bucket (refilled at `rate` per second) and a slot of its
+    concurrency window. Until the first failure the rate grows multiplicatively (slow start), afterwards
+    healthy responses grow the rate and the window additively, while 503s and timeouts shrink them
+    multiplicatively and pause the host for the Retry-After time or an exponential backoff.
+    The limiter is thread-safe and can be shared by the synchronous and the asyncio fetch paths.
+    """
+
+    def __init__(self, initial_rate: float = 5.0, min_rate: float = 0.5, max_rate: float = 50.0,
+                 initial_concurrency: float = 4, max_concurrency: float = 64, rate_increase: float = 1.0,
+                 slow_start_factor: float = 1.2, decrease_factor: float = 0.5, backoff: float = 1.0, max_backoff: float = 60.0):
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.rate_increase = rate_increase
+        self.slow_start_factor = slow_start_factor
+        self.decrease_factor = decrease_factor
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hosts: Dict[str, HostState] = {}
+        self._lock = threading.Lock()
+
+    def _host(self, url: str) -> HostState:
+        host = urlsplit(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = HostState(self.initial_rate, self.initial_concurrency)
+        return self.hosts[host]
+
+    def _try_acquire(self, url: str) -> float:
+        """Take a token and a concurrency slot if both are available.
+        :return: 0 if acquired, otherwise the number of seconds to wait before trying again
+        """
+        with self._lock:
+            state = self._host(url)
+            now = time.monotonic()
+            if now < state.blocked_until:
+                return state.blocked_until - now
+            state.tokens = min(state.tokens + (now - state.refilled_at) * state.rate, max(state.rate, 1.0))
+            state.refilled_at = now
+            if state.in_flight >= int(state.concurrency):
+                return 0.01
+            if state.tokens < 1.0:
+                return (1.0 - state.tokens) / state.rate
+            state.tokens -= 1.0
+            state.in_flight += 1
+            return 0.0
+
+    def acquire(self, url: str) -> None:
+        """Block the current thread until a request to the URL's host may be sent."""
+        while (wait := self._try_acquire(url)) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, url: str) -> None:
+        """Wait until a request to the URL's host may be sent without blocking the event loop."""
+        while (wait := self._try_acquire(url)) > 0:
+            await asyncio.sleep(wait)
+
+    def release(self, url: str, status: Optional[int] = None, retry_after: Optional[str] = None) -> None:
+        """Report the outcome of a request acquired with `acquire`.
+        :param url: URL of the request
+        :param status: HTTP status code, None if the request failed with a timeout or a connection error
+        :param retry_after: Value of the Retry-After response header
+        """
+        with self._lock:
+            state = self._host(url)
+            state.in_flight = max(state.in_flight - 1, 0)
+            if status is None or status == 503 or status == 429:
+                state.failures += 1
+                state.slow_start = False
+                state.rate = max(state.rate * self.decrease_factor, self.min_rate)
+                state.concurrency = max(state.concurrency * self.decrease_factor, 1.0)
+                pause = parse_retry_after(retry_after)
+                if pause is None:
+                    pause = min(self.backoff * 2 ** (state.failures - 1), self.max_backoff)
+                state.blocked_until = max(state.blocked_until, time.monotonic() + pause)
+            else:
+                state.failures = 0
+                increased = state.rate * self.slow_start_factor if state.slow_start else state.rate + self.rate_increase
+                state.rate = min(increased, self.max_rate)
+                state.concurrency = min(state.concurrency + 1 / state.concurrency, self.max_concurrency)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Return the current rate and concurrency window of every host."""
+        with self._lock:
+            return {host: {'rate': round(state.rate, 2), 'concurrency': round(state.concurrency, 2), 'in_flight': state.in_flight}
+                    for host, state in self.hosts.items()}
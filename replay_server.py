@@ -0,0 +1,181 @@
+import hashlib
+import os
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import unquote, urlsplit
+from data_scrapping import SEARCH_URL, search_pages, get_offers
+from page_archive import PageArchive
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'fixtures')
+
+
+def archived_pages(archive: PageArchive) -> Dict[str, bytes]:
+    """Load the latest snapshot of every page recorded in the archive.
+    :param archive: Archive of fetched pages
+    :return: Dictionary of original URL and page content
+    """
+    return dict(archive.iter_latest())
+
+
+def fixture_pages(pages: int = 10, fixtures_dir: str = FIXTURES_DIR, universal_url: str = SEARCH_URL) -> Dict[str, bytes]:
+    """Build a synthetic site from the saved sample search and offer pages.
+    Every search page links to its own set of offers, so a crawl sees distinct offer URLs.
+    :param pages: Number of search pages
+    :param fixtures_dir: Directory with `search_page.html` and `offer_page.html`
+    :param universal_url: Search URL with a `{}` placeholder for the page number
+    :return: Dictionary of original URL and page content
+    """
+    with open(os.path.join(fixtures_dir, 'search_page.html'), encoding='utf-8') as f:
+        search_page = f.read()
+    with open(os.path.join(fixtures_dir, 'offer_page.html'), 'rb') as f:
+        offer_page = f.read()
+
+    parts = urlsplit(universal_url)
+    origin = f'{parts.scheme}://{parts.netloc}'
+    site = {}
+    for number, url in enumerate(search_pages(universal_url, pages), start=1):
+        content = search_page.replace(origin, f'{origin}/p{number}').encode('utf-8')
+        site[url] = content
+        for link in get_offers(content):
+            site[link] = offer_page
+    return site
+
+
+class ReplayServer:
+    """Local HTTP server replaying recorded pages.
+    A page recorded as `https://host/path?query` is served at `http://127.0.0.1:<port>/host/path?query`,
+    and absolute links to recorded hosts inside served pages are rewritten the same way,
+    so a crawl started from `url(...)` never leaves the local machine.
+    Responses are delayed by `latency` (+ up to `jitter`) seconds and a deterministic `error_rate` fraction
+    of requests is answered with 503 (optionally with a Retry-After header).
+    """
+
+    def __init__(self, pages: Dict[str, bytes], latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 retry_after: Optional[int] = None, host: str = '127.0.0.1', port: int = 0):
+        self.pages = {self._key(url): content for url, content in pages.items()}
+        self.hosts = sorted({urlsplit(url).netloc for url in pages}, key=len, reverse=True)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.stats = Counter()
+        self._attempts = Counter()
+        self._rewritten: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self._server = self._make_server(host, port)
+        self._thread = None
+
+    @staticmethod
+    def _key(url: str) -> str:
+        parts = urlsplit(unquote(url))
+        return f'{parts.netloc}{parts.path}' + (f'?{parts.query}' if parts.query else '')
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def url(self, original_url: str) -> str:
+        """Return the local URL replaying the given recorded URL."""
+        parts = urlsplit(original_url)
+        return f'{self.base_url}/{parts.netloc}{parts.path}' + (f'?{parts.query}' if parts.query else '')
+
+    def urls(self, original_urls: List[str]) -> List[str]:
+        """Return the local URLs replaying the given recorded URLs."""
+        return [self.url(url) for url in original_urls]
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += value
+
+    def _rewrite(self, key: str) -> bytes:
+        if key not in self._rewritten:
+            content = self.pages[key]
+            for host in self.hosts:
+                local = f'{self.base_url}/{host}'.encode('utf-8')
+                content = content.replace(f'https://{host}'.encode('utf-8'), local).replace(f'http://{host}'.encode('utf-8'), local)
+            self._rewritten[key] = content
+        return self._rewritten[key]
+
+    def _inject_error(self, key: str) -> bool:
+        """Decide deterministically from the URL and the attempt number whether to answer with 503."""
+        if self.error_rate <= 0:
+            return False
+        with self._lock:
+            self._attempts[key] += 1
+            attempt = self._attempts[key]
+        digest = hashlib.sha1(f'{key}#{attempt}'.encode('utf-8')).digest()
+        return int.from_bytes(digest[:4], 'big') / 2 ** 32 < self.error_rate
+
+    def _delay(self, key: str) -> float:
+        if self.jitter <= 0:
+            return self.latency
+        digest = hashlib.sha1(key.encode('utf-8')).digest()
+        return self.latency + self.jitter * int.from_bytes(digest[:4], 'big') / 2 ** 32
+
+    def _make_server(self, host: str, port: int) -> ThreadingHTTPServer:
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                key = replay._key(self.path.lstrip('/'))
+                time.sleep(replay._delay(key))
+                if key not in replay.pages:
+                    replay._count('404')
+                    self.send_error(404)
+                    return
+                if replay._inject_error(key):
+                    replay._count('503')
+                    self.send_response(503)
+                    if replay.retry_after is not None:
+                        self.send_header('Retry-After', str(replay.retry_after))
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = replay._rewrite(key)
+                replay._count('200')
+                replay._count('bytes', len(body))
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 256
+
+        return Server((host, port), Handler)
+
+    def start(self) -> 'ReplayServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """Serve in the current thread until interrupted."""
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+if __name__ == '__main__':
+    archive_dir = 'archive'
+    pages = archived_pages(PageArchive(archive_dir)) if os.path.isdir(archive_dir) else fixture_pages(pages=10)
+    server = ReplayServer(pages, latency=0.05, error_rate=0.02, retry_after=1, port=8765)
+    print(f"Replaying {len(pages)} pages at {server.base_url}, first search page: {server.url(search_pages()[0])}")
+    server.serve_forever()
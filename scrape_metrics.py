@@ -0,0 +1,172 @@
+import bisect
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional
+
+# Upper bounds of the histogram buckets in seconds, the last bucket is unbounded
+LATENCY_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+PARSE_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25]
+SIZE_BUCKETS = [1024, 4096, 16384, 65536, 131072, 262144, 524288, 1048576]
+OFFER_FIELDS = ['title', 'price', 'area', 'interest_level', 'basic_info', 'details']
+
+
+class Histogram:
+    """Fixed-bucket histogram with count, sum, min and max."""
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile as the upper bound of the bucket containing it (the maximum for the last bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + [self.max], self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': round(self.total, 6),
+            'mean': round(self.total / self.count, 6) if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': {('+inf' if i == len(self.buckets) else str(self.buckets[i])): count for i, count in enumerate(self.counts)},
+        }
+
+
+class ScrapeMetrics:
+    """Telemetry of a crawl: request latency, response sizes, status codes, retries, parse time and missing fields.
+    Request metrics are kept per page kind ('search', 'offer', ...). The object is thread-safe.
+    Crawls given a metrics object dump its summary to `path` when they finish.
+    """
+
+    def __init__(self, path: str = 'crawl_metrics.json'):
+        self.path = path
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget everything recorded so far."""
+        with self._lock:
+            self.started_at = time.time()
+            self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.response_size = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+            self.status_codes = defaultdict(Counter)
+            self.attempts = defaultdict(Counter)
+            self.failed_requests = Counter()
+            self.parse_time = defaultdict(lambda: Histogram(PARSE_BUCKETS))
+            self.offers_parsed = 0
+            self.missing_fields = Counter()
+            self.extra = {}
+
+    def record_response(self, kind: str, seconds: float, status: Optional[int], size: int = 0) -> None:
+        """Record a single HTTP attempt.
+        :param kind: Kind of the page
+        :param seconds: Time until the response (or the error)
+        :param status: HTTP status code, None for timeouts and connection errors
+        :param size: Size of the response body in bytes
+        """
+        with self._lock:
+            self.latency[kind].observe(seconds)
+            self.status_codes[kind][str(status) if status is not None else 'error'] += 1
+            if status == 200:
+                self.response_size[kind].observe(size)
+
+    def record_request(self, kind: str, attempts: int, succeeded: bool) -> None:
+        """Record the outcome of a fetch including its retries.
+        :param kind: Kind of the page
+        :param attempts: Number of HTTP attempts made
+        :param succeeded: Whether the page content was obtained
+        """
+        with self._lock:
+            self.attempts[kind][attempts] += 1
+            if not succeeded:
+                self.failed_requests[kind] += 1
+
+    def record_parse(self, kind: str, seconds: float, offer_details: Optional[Dict] = None) -> None:
+        """Record the parse time of a page and, for offers, which fields were not provided.
+        :param kind: Kind of the page
+        :param seconds: Parse time
+        :param offer_details: Parsed offer details
+        """
+        with self._lock:
+            self.parse_time[kind].observe(seconds)
+            if offer_details is not None:
+                self.offers_parsed += 1
+                for field in OFFER_FIELDS:
+                    if offer_details.get(field) in ('Not provided', [], {}, None):
+                        self.missing_fields[field] += 1
+
+    def summary(self) -> Dict:
+        """Return all metrics as a JSON-serializable dictionary."""
+        with self._lock:
+            kinds = sorted(set(self.latency) | set(self.attempts))
+            requests = {}
+            for kind in kinds:
+                attempts = self.attempts[kind]
+                requests[kind] = {
+                    'requests': sum(attempts.values()),
+                    'retries': sum((n - 1) * count for n, count in attempts.items()),
+                    'attempts': {str(n): count for n, count in sorted(attempts.items())},
+                    'failed': self.failed_requests[kind],
+                    'status_codes': dict(self.status_codes[kind]),
+                    'latency_seconds': self.latency[kind].summary(),
+                    'response_bytes': self.response_size[kind].summary(),
+                    'total_bytes': int(self.response_size[kind].total),
+                }
+            return {
+                'started_at': self.started_at,
+                'duration_seconds': round(time.time() - self.started_at, 3),
+                'requests': requests,
+                'parse_seconds': {kind: histogram.summary() for kind, histogram in self.parse_time.items()},
+                'offers_parsed': self.offers_parsed,
+                'missing_field_rate': {field: round(self.missing_fields[field] / self.offers_parsed, 4) if self.offers_parsed else None
+                                       for field in OFFER_FIELDS},
+                **self.extra,
+            }
+
+    def dump(self, path: Optional[str] = None) -> None:
+        """Write the summary to a JSON file.
+        :param path: Output path, `self.path` by default
+        """
+        with open(path or self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2, ensure_ascii=False)
+
+
+def timed_parse(metrics: Optional[ScrapeMetrics], kind: str, parse: Callable, content):
+    """Call a parse function on the page content and record its run time.
+    For 'offer' pages the returned offer details are checked for missing fields as well.
+    :param metrics: Crawl metrics, the function is just called if None
+    :param kind: Kind of the page
+    :param parse: Parse function
+    :param content: HTML content of the page
+    :return: Result of the parse function
+    """
+    if metrics is None:
+        return parse(content)
+    start = time.perf_counter()
+    result = parse(content)
+    metrics.record_parse(kind, time.perf_counter() - start, result if kind == 'offer' else None)
+    return result
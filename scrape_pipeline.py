@@ -0,0 +1,184 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional
+import aiohttp
+from data_scrapping import HEADERS, search_pages, get_offers, parse_offer_details
+from async_scrapping import fetch_page
+from offer_sink import OfferSink, open_sink
+from page_archive import PageArchive
+from rate_limiter import AdaptiveRateLimiter
+from scrape_metrics import ScrapeMetrics
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class StageCounter:
+    """Throughput counter of a single pipeline stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        self.busy_time = 0.0
+        self.started_at = None
+        self.finished_at = None
+
+    def summary(self) -> Dict[str, float]:
+        """Return the counters with the stage throughput in items per second of wall time."""
+        elapsed = (self.finished_at or time.perf_counter()) - (self.started_at or time.perf_counter())
+        return {
+            'items_in': self.items_in,
+            'items_out': self.items_out,
+            'busy_time': round(self.busy_time, 3),
+            'elapsed': round(elapsed, 3),
+            'items_per_sec': round(self.items_in / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+
+async def run_stage(counter: StageCounter, in_queue: asyncio.Queue, out_queue: Optional[asyncio.Queue], workers: int,
+                    process: Callable[[object], Awaitable[List]]) -> None:
+    """Run `workers` consumers of `in_queue`, every result of `process` is put into `out_queue`.
+    Putting into a full `out_queue` blocks the consumer, which is how backpressure propagates upstream.
+    When the input is exhausted, one end marker per downstream worker is put into `out_queue` by `pipeline`.
+    :param counter: Throughput counter of the stage
+    :param in_queue: Input queue of the stage
+    :param out_queue: Output queue of the stage, None for the last stage
+    :param workers: Number of concurrent consumers
+    :param process: Coroutine function turning one input item into a list of output items
+    """
+    counter.started_at = time.perf_counter()
+
+    async def worker() -> None:
+        while True:
+            item = await in_queue.get()
+            if item is _DONE:
+                return
+            counter.items_in += 1
+            start = time.perf_counter()
+            results = await process(item)
+            counter.busy_time += time.perf_counter() - start
+            for result in results:
+                counter.items_out += 1
+                if out_queue is not None:
+                    await out_queue.put(result)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    counter.finished_at = time.perf_counter()
+
+
+async def pipeline(pages: List[str], sink: OfferSink, fetch_concurrency: int = 16, parse_workers: int = 4,
+                   queue_size: int = 64, timeout: float = 30, archive: Optional[PageArchive] = None,
+                   limiter: Optional[AdaptiveRateLimiter] = None, metrics: Optional[ScrapeMetrics] = None) -> Dict[str, Dict[str, float]]:
+    """Streaming scrape pipeline: page fetch -> link extraction -> offer fetch -> parsing -> writing.
+    Stages are connected by bounded queues, so network, parsing and disk I/O overlap while the number of
+    pages held in memory never exceeds the queue sizes, regardless of the crawl size.
+    Link extraction and parsing run in a process pool. Offers are written in completion order.
+    :param pages: List of search page URLs
+    :param sink: Output sink for the offers
+    :param fetch_concurrency: Maximum number of requests in flight (shared by search and offer pages)
+    :param parse_workers: Number of processes in the parsing pool
+    :param queue_size: Capacity of every queue between stages
+    :param timeout: Total timeout of a single request in seconds
+    :param archive: Archive of fetched pages
+    :param limiter: Shared rate limiter
+    :param metrics: Crawl metrics, dumped together with the stage counters to `metrics.path` when the pipeline ends.
+        Parse times are measured around the process pool calls, so they include the transfer to and from the workers.
+    :return: Per-stage throughput counters
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(fetch_concurrency)
+    page_urls, page_contents, offer_links, offer_contents, offers = (asyncio.Queue(queue_size) for _ in range(5))
+    counters = {name: StageCounter(name) for name in ('page_fetch', 'link_extraction', 'offer_fetch', 'parsing', 'writing')}
+
+    connector = aiohttp.TCPConnector(limit=fetch_concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    with ProcessPoolExecutor(max_workers=parse_workers) as pool:
+        async with aiohttp.ClientSession(headers=HEADERS, connector=connector, timeout=client_timeout) as session:
+
+            async def fetch_search_page(url: str) -> List[bytes]:
+                content = await fetch_page(session, url, semaphore, archive=archive, kind='search', limiter=limiter, metrics=metrics)
+                return [content] if content is not None else []
+
+            async def extract_links(content: bytes) -> List[str]:
+                start = time.perf_counter()
+                links = await loop.run_in_executor(pool, get_offers, content)
+                if metrics is not None:
+                    metrics.record_parse('search', time.perf_counter() - start)
+                return links
+
+            async def fetch_offer_page(url: str) -> List[tuple]:
+                content = await fetch_page(session, url, semaphore, archive=archive, kind='offer', limiter=limiter, metrics=metrics)
+                return [(url, content)] if content is not None else []
+
+            async def parse(item: tuple) -> List[tuple]:
+                url, content = item
+                start = time.perf_counter()
+                offer_details = await loop.run_in_executor(pool, parse_offer_details, content)
+                if metrics is not None:
+                    metrics.record_parse('offer', time.perf_counter() - start, offer_details)
+                return [(url, offer_details)]
+
+            async def write(item: tuple) -> List:
+                url, offer_details = item
+                sink.write(offer_details, url=url)
+                return []
+
+            stages = [
+                (counters['page_fetch'], page_urls, page_contents, fetch_concurrency, fetch_search_page),
+                (counters['link_extraction'], page_contents, offer_links, parse_workers, extract_links),
+                (counters['offer_fetch'], offer_links, offer_contents, fetch_concurrency, fetch_offer_page),
+                (counters['parsing'], offer_contents, offers, parse_workers, parse),
+                (counters['writing'], offers, None, 1, write),
+            ]
+
+            async def feed() -> None:
+                for url in pages:
+                    await page_urls.put(url)
+                for _ in range(fetch_concurrency):
+                    await page_urls.put(_DONE)
+
+            async def stage_then_close(index: int) -> None:
+                counter, in_queue, out_queue, workers, process = stages[index]
+                await run_stage(counter, in_queue, out_queue, workers, process)
+                if out_queue is not None:
+                    for _ in range(stages[index + 1][3]):
+                        await out_queue.put(_DONE)
+
+            try:
+                await asyncio.gather(feed(), *(stage_then_close(i) for i in range(len(stages))))
+            finally:
+                if metrics is not None:
+                    metrics.extra['stages'] = {name: counter.summary() for name, counter in counters.items()}
+                    metrics.dump()
+    sink.flush()
+    return {name: counter.summary() for name, counter in counters.items()}
+
+
+def run_pipeline(pages: List[str], sink: OfferSink, fetch_concurrency: int = 16, parse_workers: int = 4,
+                 queue_size: int = 64, archive: Optional[PageArchive] = None,
+                 limiter: Optional[AdaptiveRateLimiter] = None, metrics: Optional[ScrapeMetrics] = None) -> Dict[str, Dict[str, float]]:
+    """Run the streaming scrape pipeline from synchronous code and print the per-stage counters.
+    :param pages: List of search page URLs
+    :param sink: Output sink for the offers
+    :param fetch_concurrency: Maximum number of requests in flight
+    :param parse_workers: Number of processes in the parsing pool
+    :param queue_size: Capacity of every queue between stages
+    :param archive: Archive of fetched pages
+    :param limiter: Shared rate limiter
+    :param metrics: Crawl metrics
+    :return: Per-stage throughput counters
+    """
+    counters = asyncio.run(pipeline(pages, sink, fetch_concurrency, parse_workers, queue_size, archive=archive, limiter=limiter,
+                                    metrics=metrics))
+    for name, summary in counters.items():
+        print(f"{name:>16}: {summary['items_in']} in, {summary['items_out']} out, {summary['items_per_sec']} items/s")
+    return counters
+
+
+if __name__ == '__main__':
+    archive = PageArchive('archive')
+    with open_sink('listings.sqlite', batch_size=500) as sink:
+        run_pipeline(search_pages(), sink, fetch_concurrency=16, parse_workers=4, archive=archive, limiter=AdaptiveRateLimiter(),
+                     metrics=ScrapeMetrics('crawl_metrics.json'))
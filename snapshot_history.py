@@ -0,0 +1,142 @@
+import os
+import sqlite3
+from datetime import datetime, timezone
+from typing import List, Optional
+import pandas as pd
+from cleaned_dataset import write_dataset, read_dataset
+
+HISTORY_DIR = 'history'
+
+
+class SnapshotHistory:
+    """Append-only history of the cleaned dataset with a price index per district.
+    - Every scrape is kept as a snapshot partition `<root>/date=<YYYY-MM-DD>/offers.parquet`, written once and never
+      changed, in the typed format of `cleaned_dataset.py`.
+    - `price_index.sqlite` holds additive aggregates of every snapshot and district (offers, sums of price, area and
+      price per m², their squares, minimum and maximum). Adding a snapshot aggregates only the new snapshot, queries
+      read the aggregates and never touch the snapshots; sums of several districts combine into the city index.
+    """
+
+    def __init__(self, root: str = HISTORY_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(root, 'price_index.sqlite'))
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS price_index (
+                date TEXT NOT NULL,
+                district TEXT NOT NULL,
+                offers INTEGER NOT NULL,
+                price_sum REAL NOT NULL,
+                area_sum REAL NOT NULL,
+                price_per_m2_sum REAL NOT NULL,
+                price_per_m2_squares REAL NOT NULL,
+                price_per_m2_min REAL NOT NULL,
+                price_per_m2_max REAL NOT NULL,
+                PRIMARY KEY (district, date)
+            );
+            CREATE INDEX IF NOT EXISTS price_index_date ON price_index (date);
+        ''')
+
+    def partition_path(self, date: str) -> str:
+        """Return the path of the snapshot of a date."""
+        return os.path.join(self.root, f'date={date}', 'offers.parquet')
+
+    def dates(self) -> List[str]:
+        """Return the dates of all snapshots in order."""
+        return sorted(name[len('date='):] for name in os.listdir(self.root)
+                      if name.startswith('date=') and os.path.exists(self.partition_path(name[len('date='):])))
+
+    def add_snapshot(self, data: pd.DataFrame, date: Optional[str] = None) -> str:
+        """Store the cleaned dataset of a scrape and add it to the price index.
+        :param data: Cleaned offers (see `data_clearing.load_cleaned_data`)
+        :param date: Date of the scrape (ISO format), today by default
+        :return: Date of the snapshot
+        """
+        date = date or datetime.now(timezone.utc).date().isoformat()
+        datetime.strptime(date, '%Y-%m-%d')
+        path = self.partition_path(date)
+        if os.path.exists(path):
+            raise FileExistsError(f"Snapshot of {date} already exists, snapshots are never overwritten")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_dataset(data, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        self._index(date, data)
+        return date
+
+    def _index(self, date: str, data: pd.DataFrame) -> None:
+        """Aggregate a snapshot per district into the price index."""
+        per_m2 = data['price'] / data['area']
+        groups = data.assign(price_per_m2=per_m2, price_per_m2_square=per_m2 ** 2).groupby('location', observed=True)
+        aggregates = groups.agg(offers=('price', 'size'), price_sum=('price', 'sum'), area_sum=('area', 'sum'),
+                                price_per_m2_sum=('price_per_m2', 'sum'), price_per_m2_squares=('price_per_m2_square', 'sum'),
+                                price_per_m2_min=('price_per_m2', 'min'), price_per_m2_max=('price_per_m2', 'max'))
+        rows = [(date, str(row[0]), int(row[1]), *map(float, row[2:])) for row in aggregates.itertuples()]
+        with self.connection:
+            self.connection.execute('DELETE FROM price_index WHERE date = ?', (date,))
+            self.connection.executemany('INSERT INTO price_index VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def rebuild_index(self) -> None:
+        """Recompute the price index from all snapshots, e.g. after an interrupted `add_snapshot`."""
+        with self.connection:
+            self.connection.execute('DELETE FROM price_index')
+        for date in self.dates():
+            self._index(date, read_dataset(self.partition_path(date), columns=['location', 'price', 'area']))
+
+    def read_snapshots(self, start: Optional[str] = None, end: Optional[str] = None,
+                       columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Read the snapshots of a date range, only the requested columns are read.
+        :param start: First date (inclusive)
+        :param end: Last date (inclusive)
+        :param columns: Columns of the cleaned dataset to read
+        :return: DataFrame of offers with the snapshot date in `date`
+        """
+        dates = [date for date in self.dates() if (start is None or date >= start) and (end is None or date <= end)]
+        frames = [read_dataset(self.partition_path(date), columns).assign(date=date) for date in dates]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=(columns or []) + ['date'])
+
+    def price_index(self, district: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None,
+                    base: Optional[str] = None) -> pd.DataFrame:
+        """Read the price index, by district or for the whole city.
+        :param district: District to read, None for all districts combined
+        :param start: First date (inclusive)
+        :param end: Last date (inclusive)
+        :param base: Date whose mean price per m² equals 100 in `index`, the first returned date by default
+        :return: DataFrame by date with the number of offers, mean price, mean area, mean price per m² and its
+            standard deviation, minimum and maximum and the index of the mean price per m²
+        """
+        conditions, parameters = [], []
+        for condition, value in (('district = ?', district), ('date >= ?', start), ('date <= ?', end)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+        data = pd.read_sql_query(f'''
+            SELECT date, SUM(offers) AS offers, SUM(price_sum) AS price_sum, SUM(area_sum) AS area_sum,
+                   SUM(price_per_m2_sum) AS price_per_m2_sum, SUM(price_per_m2_squares) AS price_per_m2_squares,
+                   MIN(price_per_m2_min) AS price_per_m2_min, MAX(price_per_m2_max) AS price_per_m2_max
+            FROM price_index{where} GROUP BY date ORDER BY date
+        ''', self.connection, params=parameters)
+        mean = data['price_per_m2_sum'] / data['offers']
+        index = pd.DataFrame({
+            'date': data['date'],
+            'offers': data['offers'],
+            'mean_price': data['price_sum'] / data['offers'],
+            'mean_area': data['area_sum'] / data['offers'],
+            'mean_price_per_m2': mean,
+            'std_price_per_m2': (data['price_per_m2_squares'] / data['offers'] - mean ** 2).clip(lower=0) ** 0.5,
+            'min_price_per_m2': data['price_per_m2_min'],
+            'max_price_per_m2': data['price_per_m2_max'],
+        })
+        if not index.empty:
+            base_mean = mean[index['date'] == base].iloc[0] if base in set(index['date']) else mean.iloc[0]
+            index['index'] = 100 * mean / base_mean
+        return index.set_index('date')
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()